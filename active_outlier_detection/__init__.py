@@ -1,2 +1,11 @@
-from . import concept_drift_detection
-from . import detection_pipeline
+import importlib
+
+# Subpackages are imported when first accessed, as both import scikit-learn or scipy
+SUBPACKAGES = ('concept_drift_detection', 'detection_pipeline')
+
+
+def __getattr__(name):
+    if name not in SUBPACKAGES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    return importlib.import_module(f'.{name}', __name__)
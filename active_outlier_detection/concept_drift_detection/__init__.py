@@ -1 +1,13 @@
-from .ksblwin import KSBLWIN
+from utils.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'KSBLWIN': '.ksblwin',
+    'MultiKSBLWIN': '.multi_ksblwin',
+    'KSEngine': '.ks_engine',
+    'BaseBlockDriftDetector': '.base_block_drift_detector',
+    'OnlineDriftDetector': '.online_drift_detector',
+    'ADWIN': '.adwin',
+    'PageHinkley': '.page_hinkley',
+    'SlidingKSWIN': '.sliding_kswin',
+    'OrderStatisticTree': '.order_statistic_tree',
+})
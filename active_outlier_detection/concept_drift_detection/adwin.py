@@ -0,0 +1,141 @@
+import math
+
+from .online_drift_detector import OnlineDriftDetector
+
+
+class ADWIN(OnlineDriftDetector):
+    """
+    ADaptive WINdowing (Bifet and Gavaldà, 2007). It keeps a variable-length window of
+    the elements since the last change, compressed in an exponential histogram of
+    buckets, and detects drift when two sub-windows have means further apart than the
+    Hoeffding-like bound for confidence delta, dropping the older one. Inserting an
+    element is amortized O(1), and every clock elements the cuts are checked in
+    O(log W), W being the length of the adaptive window.
+
+    Elements are measured in standard deviations of the first reference window, as the
+    bound assumes they lie in a unit range.
+    """
+    def __init__(self, window_size=50, delta=0.002, clock=32, max_buckets=5, min_sub_window=5):
+        """
+        :param delta: confidence of the test, lower values detect fewer drifts
+        :param clock: number of elements between checks for drift
+        :param max_buckets: number of buckets of each size kept before merging the two oldest
+        :param min_sub_window: minimum length of each sub-window of a cut
+        """
+        super().__init__(window_size)
+        self.delta = delta
+        self.clock = clock
+        self.max_buckets = max_buckets
+        self.min_sub_window = min_sub_window
+
+        self._scale = None
+        # Row i holds [total, variance] buckets of 2^i elements, oldest first.
+        # Rows with larger buckets hold older elements
+        self._rows = []
+        self._width = 0
+        self._total = 0.0
+        self._variance = 0.0
+        self._ticks = 0
+
+    @property
+    def width(self) -> int:
+        """
+        Number of elements in the adaptive window.
+        """
+        return self._width
+
+    def _start(self):
+        # The adaptive window already drops the elements before a drift, so it is only set up once
+        if self._scale is not None:
+            return
+
+        std = self.reference_window.std()
+        self._scale = 1.0 / std if std > 0 else 1.0
+        for x in self.reference_window:
+            self._insert(x * self._scale)
+
+    def _update(self, x, evicted) -> bool:
+        self._insert(x * self._scale)
+
+        self._ticks += 1
+        if self._ticks % self.clock != 0 or self._width < 2 * self.min_sub_window:
+            return False
+
+        return self._shrink()
+
+    def _insert(self, x):
+        self._width += 1
+        if self._width > 1:
+            mean = self._total / (self._width - 1)
+            self._variance += (self._width - 1) * (x - mean) ** 2 / self._width
+        self._total += x
+
+        if not self._rows:
+            self._rows.append([])
+        self._rows[0].append([x, 0.0])
+
+        # Merge the two oldest buckets of every row with too many into one of the next row
+        size = 1
+        for i in range(len(self._rows)):
+            row = self._rows[i]
+            if len(row) <= self.max_buckets:
+                break
+
+            (total_1, variance_1), (total_2, variance_2) = row[0], row[1]
+            del row[:2]
+            variance = variance_1 + variance_2 + size * size * (total_1 / size - total_2 / size) ** 2 / (2 * size)
+
+            if i + 1 == len(self._rows):
+                self._rows.append([])
+            self._rows[i + 1].append([total_1 + total_2, variance])
+            size *= 2
+
+    def _shrink(self) -> bool:
+        """
+        Drops the oldest buckets while some cut of the window has sub-windows with different means.
+
+        :return: whether any bucket was dropped
+        """
+        shrunk = False
+        while self._width >= 2 * self.min_sub_window and self._has_cut():
+            self._drop_oldest()
+            shrunk = True
+
+        return shrunk
+
+    def _has_cut(self) -> bool:
+        log_term = math.log(2 * math.log(self._width) / self.delta)
+        variance = self._variance / self._width
+
+        # Cuts between buckets, from the oldest one
+        n_0, total_0 = 0, 0.0
+        for i in range(len(self._rows) - 1, -1, -1):
+            size = 1 << i
+            for total, _ in self._rows[i]:
+                n_0 += size
+                total_0 += total
+                n_1 = self._width - n_0
+                if n_1 < self.min_sub_window:
+                    return False
+                if n_0 < self.min_sub_window:
+                    continue
+
+                m = 1 / (n_0 - self.min_sub_window + 1) + 1 / (n_1 - self.min_sub_window + 1)
+                epsilon = math.sqrt(2 * m * variance * log_term) + 2 / 3 * log_term * m
+                if abs(total_0 / n_0 - (self._total - total_0) / n_1) > epsilon:
+                    return True
+
+        return False
+
+    def _drop_oldest(self):
+        i = len(self._rows) - 1
+        size = 1 << i
+        total, variance = self._rows[i].pop(0)
+        if not self._rows[i]:
+            self._rows.pop()
+
+        self._width -= size
+        self._total -= total
+        mean = total / size
+        self._variance -= variance + size * self._width * (mean - self._total / self._width) ** 2 / (size + self._width)
+        self._variance = max(self._variance, 0.0)
@@ -1,3 +1,4 @@
+import pickle
 from abc import ABC, abstractmethod
 
 import numpy as np
@@ -5,8 +6,12 @@ import numpy as np
 
 class BaseBlockDriftDetector(ABC):
     def __init__(self, window_size=50):
-        self._reference_window = np.array([])
-        self._current_window = np.array([])
+        # Both windows live in preallocated buffers of window_size elements,
+        # the properties below expose views of the filled part of each one
+        self._reference_buffer = np.empty(window_size, dtype=np.float64)
+        self._current_buffer = np.empty(window_size, dtype=np.float64)
+        self._reference_length = 0
+        self._current_length = 0
         self._warm = False  # Warm = True when the reference window is full
 
         self.window_size = window_size
@@ -14,11 +19,11 @@ class BaseBlockDriftDetector(ABC):
 
     @property
     def reference_window(self) -> np.array:
-        return self._reference_window
+        return self._reference_buffer[:self._reference_length]
 
     @property
     def current_window(self) -> np.array:
-        return self._current_window
+        return self._current_buffer[:self._current_length]
 
     @property
     def warm(self) -> bool:
@@ -28,5 +33,93 @@ class BaseBlockDriftDetector(ABC):
     def detect_drift(self, x):
         pass
 
+    def detect_drift_many(self, values) -> tuple[int, bool]:
+        """
+        Feeds elements of values to the detector until the detector warms up,
+        the current window is full or values run out, whichever comes first.
+        It is equivalent to calling detect_drift on each consumed element.
+
+        :param values: 1D array of elements to be added to the windows
+        :return: number of consumed elements and whether the last one detected drift
+        """
+        self.drift_detected = False
+        consumed = 0
+        for x in values:
+            was_warm = self.warm
+            self.detect_drift(x)
+            consumed += 1
+
+            if self.drift_detected or self.is_window_full() or self.warm != was_warm:
+                break
+
+        return consumed, self.drift_detected
+
+    def snapshot(self) -> bytes:
+        """
+        :return: binary snapshot of the whole state of the detector
+        """
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def restore(snapshot) -> "BaseBlockDriftDetector":
+        return pickle.loads(snapshot)
+
+    def __getstate__(self):
+        # Only the filled part of the buffers is kept
+        state = self.__dict__.copy()
+        state['_reference_buffer'] = self.reference_window.copy()
+        state['_current_buffer'] = self.current_window.copy()
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+        self._reference_buffer = np.empty(self.window_size, dtype=np.float64)
+        self._reference_buffer[:self._reference_length] = state['_reference_buffer']
+        self._current_buffer = np.empty(self.window_size, dtype=np.float64)
+        self._current_buffer[:self._current_length] = state['_current_buffer']
+
     def is_window_full(self):
-        return len(self.current_window) == self.window_size
+        return self._current_length == self.window_size
+
+    def is_reference_full(self):
+        return self._reference_length == self.window_size
+
+    def _append_reference(self, x):
+        self._reference_buffer[self._reference_length] = x
+        self._reference_length += 1
+
+    def _extend_reference(self, values) -> int:
+        n = min(self.window_size - self._reference_length, len(values))
+        self._reference_buffer[self._reference_length:self._reference_length + n] = values[:n]
+        self._reference_length += n
+
+        return n
+
+    def _extend_current(self, values) -> int:
+        if self._current_length == self.window_size:
+            self._current_length = 0
+
+        n = min(self.window_size - self._current_length, len(values))
+        self._current_buffer[self._current_length:self._current_length + n] = values[:n]
+        self._current_length += n
+
+        return n
+
+    def _append_current(self, x):
+        # The current window is a block window: once full, the next
+        # element starts a new block at the beginning of the buffer
+        if self._current_length == self.window_size:
+            self._current_length = 0
+
+        self._current_buffer[self._current_length] = x
+        self._current_length += 1
+
+    def _replace_reference(self):
+        """
+        Replaces the reference window with the current window. The current
+        window is kept as is, so it can still be read after the replacement.
+        """
+        np.copyto(self._reference_buffer[:self._current_length], self.current_window)
+        self._reference_length = self._current_length
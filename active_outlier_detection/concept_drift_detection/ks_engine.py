@@ -0,0 +1,147 @@
+from functools import lru_cache
+
+import numpy as np
+from scipy.stats import ks_2samp, kstwo
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Same threshold scipy uses to choose between the exact and asymptotic p-values
+MAX_EXACT_N = 10000
+
+
+def _max_cdf_difference(sorted_a, sorted_b) -> int:
+    """
+    Walks both sorted samples at once and returns max |n_b * F_a(x) - n_a * F_b(x)|,
+    that is, the KS statistic scaled by n_a * n_b.
+    """
+    n_a = sorted_a.shape[0]
+    n_b = sorted_b.shape[0]
+    i = 0
+    j = 0
+    max_diff = 0
+    while i < n_a and j < n_b:
+        value = min(sorted_a[i], sorted_b[j])
+        while i < n_a and sorted_a[i] == value:
+            i += 1
+        while j < n_b and sorted_b[j] == value:
+            j += 1
+
+        diff = abs(i * n_b - j * n_a)
+        if diff > max_diff:
+            max_diff = diff
+
+    return max_diff
+
+
+def _max_cdf_difference_numpy(sorted_a, sorted_b) -> int:
+    data_all = np.concatenate([sorted_a, sorted_b])
+    cdf_a = np.searchsorted(sorted_a, data_all, side='right')
+    cdf_b = np.searchsorted(sorted_b, data_all, side='right')
+
+    return int(np.max(np.abs(cdf_a * sorted_b.shape[0] - cdf_b * sorted_a.shape[0])))
+
+
+if njit is not None:
+    _max_cdf_difference = njit(cache=True, nogil=True)(_max_cdf_difference)
+else:
+    _max_cdf_difference = _max_cdf_difference_numpy
+
+
+@lru_cache(maxsize=None)
+def _p_value_equal_sizes(n, h) -> float:
+    """
+    Two-sided p-value of the KS statistic h / n for two samples of size n,
+    computed as scipy does and cached, so every (n, h) pair is only computed once.
+    """
+    if h == 0:
+        return 1.0
+
+    if n <= MAX_EXACT_N:
+        # Pr(D_{n,n} >= h/n) with the same Horner-like scheme scipy uses
+        p = 0.0
+        with np.errstate(invalid='raise', over='raise'):
+            try:
+                k = n // h
+                while k >= 0:
+                    p1 = 1.0
+                    for j in range(h):
+                        p1 = (n - k * h - j) * p1 / (n + k * h + j + 1)
+                    p = p1 * (1.0 - p)
+                    k -= 1
+                p = 2 * p
+            except (FloatingPointError, OverflowError):
+                p = np.nan
+
+        if 0 <= p <= 1:
+            return p
+
+    return float(np.clip(kstwo.sf(h / n, np.round(n / 2)), 0, 1))
+
+
+def ks_2samp_rows(a, b) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Two-sided KS test between every row of a and the same row of b, all in one go.
+
+    :param a: array of shape (n_tests, n)
+    :param b: array of shape (n_tests, n)
+    :return: KS statistics and p-values, one per row
+    """
+    n = a.shape[1]
+    data = np.concatenate([a, b], axis=1)
+    order = np.argsort(data, axis=1, kind='stable')
+    sorted_data = np.take_along_axis(data, order, axis=1)
+
+    # n * (F_a(x) - F_b(x)), only valid at the last element of every run of tied values
+    cdf_diff = np.cumsum(np.where(order < n, 1, -1), axis=1)
+    last_of_ties = np.ones(sorted_data.shape, dtype=bool)
+    last_of_ties[:, :-1] = sorted_data[:, 1:] != sorted_data[:, :-1]
+
+    h = np.max(np.abs(np.where(last_of_ties, cdf_diff, 0)), axis=1)
+
+    unique_h, inverse = np.unique(h, return_inverse=True)
+    p_values = np.array([_p_value_equal_sizes(n, int(value)) for value in unique_h])[inverse]
+
+    return h / n, p_values
+
+
+class KSEngine:
+    """
+    Two-sample KS test that keeps the reference sample sorted until it is replaced,
+    so each test only sorts the new sample.
+    """
+    def __init__(self):
+        self._reference = None
+        self._last_sample = None
+
+    @property
+    def has_reference(self) -> bool:
+        return self._reference is not None
+
+    def set_reference(self, reference):
+        self._reference = np.sort(reference)
+
+    def promote_last_sample(self):
+        """
+        Makes the sample of the last test the new reference, without sorting it again.
+        """
+        self._reference = self._last_sample
+
+    def test(self, sample) -> tuple[float, float]:
+        """
+        :param sample: sample to compare against the reference
+        :return: KS statistic and two-sided p-value
+        """
+        self._last_sample = np.sort(sample)
+
+        n_ref = self._reference.shape[0]
+        n_sample = self._last_sample.shape[0]
+        if n_ref != n_sample:
+            res = ks_2samp(self._reference, self._last_sample)
+            return res.statistic, res.pvalue
+
+        h = _max_cdf_difference(self._reference, self._last_sample) // n_ref
+
+        return h / n_ref, _p_value_equal_sizes(n_ref, h)
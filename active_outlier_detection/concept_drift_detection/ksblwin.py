@@ -1,40 +1,86 @@
-import numpy as np
 from scipy.stats import ks_2samp
 
+from utils import instrumentation
 from .base_block_drift_detector import BaseBlockDriftDetector
+from .ks_engine import KSEngine
 
 
 class KSBLWIN(BaseBlockDriftDetector):
-    def __init__(self, window_size=50, alpha=0.01):
+    KS_ENGINES = ("scipy", "fast")
+
+    def __init__(self, window_size=50, alpha=0.01, ks_engine="scipy"):
         super().__init__(window_size)
+        if ks_engine not in KSBLWIN.KS_ENGINES:
+            raise ValueError(f"KS engine {ks_engine} not available. Available engines: {KSBLWIN.KS_ENGINES}")
+
         self.alpha = alpha
+        self.ks_engine = ks_engine
+        self._ks = KSEngine() if ks_engine == "fast" else None
 
     def detect_drift(self, x) -> bool:
         self.drift_detected = False
-        ref_length = self._reference_window.shape[0]
-        if ref_length < self.window_size:
-            self._reference_window = np.concatenate([self._reference_window, [x]])
+        if not self.is_reference_full():
+            self._append_reference(x)
             return self.drift_detected
 
         if not self.warm:
             self._warm = True
 
-        self._current_window = np.concatenate([self._current_window, [x]])
-
-        curr_length = self._current_window.shape[0]
-        if curr_length > self.window_size:
-            self._current_window = np.array([x])
+        self._append_current(x)
 
         if self.is_window_full():
             self._detect_drift()
 
         return self.drift_detected
 
+    def detect_drift_many(self, values) -> tuple[int, bool]:
+        self.drift_detected = False
+        consumed = 0
+        if not self.is_reference_full():
+            consumed = self._extend_reference(values)
+
+        if consumed == len(values):
+            return consumed, self.drift_detected
+
+        if not self.warm:
+            # Stop right after warming up, as the pipeline trains on the
+            # reference window before anything else reaches the detector
+            self._warm = True
+            consumed += self._extend_current(values[consumed:consumed + 1])
+        else:
+            consumed += self._extend_current(values[consumed:])
+
+        if self.is_window_full():
+            self._detect_drift()
+
+        return consumed, self.drift_detected
+
     def _detect_drift(self):
-        stat, p_value = ks_2samp(self.reference_window, self.current_window)
+        with instrumentation.stage('ks_test'):
+            stat, p_value = self._ks_test()
 
         if p_value < self.alpha and stat > 0.1:
             self.drift_detected = True
-            self._reference_window = self.current_window
+            instrumentation.count('drifts')
+            self._replace_reference()
+            if self._ks is not None:
+                self._ks.promote_last_sample()
         else:
             self.drift_detected = False
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        # The sorted reference of the KS engine is rebuilt from the reference window when needed
+        if self._ks is not None:
+            state['_ks'] = KSEngine()
+
+        return state
+
+    def _ks_test(self):
+        if self._ks is None:
+            return ks_2samp(self.reference_window, self.current_window)
+
+        if not self._ks.has_reference:
+            self._ks.set_reference(self.reference_window)
+
+        return self._ks.test(self.current_window)
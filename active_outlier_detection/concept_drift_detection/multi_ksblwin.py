@@ -0,0 +1,78 @@
+import numpy as np
+
+from .ks_engine import ks_2samp_rows
+
+
+class MultiKSBLWIN:
+    """
+    KSBLWIN over many streams at once. Every stream behaves as its own KSBLWIN,
+    but the windows of all of them live in 2D arrays and the KS tests of the
+    streams whose window fills on the same tick run in a single batched call.
+    """
+    def __init__(self, n_streams, window_size=50, alpha=0.01):
+        self._reference_windows = np.empty((n_streams, window_size), dtype=np.float64)
+        self._current_windows = np.empty((n_streams, window_size), dtype=np.float64)
+        self._reference_lengths = np.zeros(n_streams, dtype=np.int64)
+        self._current_lengths = np.zeros(n_streams, dtype=np.int64)
+        self._warm = np.zeros(n_streams, dtype=bool)  # Warm = True when the reference window is full
+
+        self.n_streams = n_streams
+        self.window_size = window_size
+        self.alpha = alpha
+        self.drift_detected = np.zeros(n_streams, dtype=bool)
+
+    @property
+    def reference_windows(self) -> np.ndarray:
+        return self._reference_windows
+
+    @property
+    def current_windows(self) -> np.ndarray:
+        return self._current_windows
+
+    @property
+    def current_lengths(self) -> np.ndarray:
+        return self._current_lengths
+
+    @property
+    def warm(self) -> np.ndarray:
+        return self._warm
+
+    def is_window_full(self) -> np.ndarray:
+        return self._current_lengths == self.window_size
+
+    def detect_drift(self, x) -> np.ndarray:
+        """
+        :param x: array of shape (n_streams,) with one element per stream. NaN means
+            the stream has no element on this tick, so its state does not change
+        :return: boolean array of shape (n_streams,), True for the streams with drift
+        """
+        x = np.asarray(x, dtype=np.float64)
+        self.drift_detected = np.zeros(self.n_streams, dtype=bool)
+
+        present = ~np.isnan(x)
+        filling = present & (self._reference_lengths < self.window_size)
+
+        streams = np.flatnonzero(filling)
+        self._reference_windows[streams, self._reference_lengths[streams]] = x[streams]
+        self._reference_lengths[streams] += 1
+
+        streams = np.flatnonzero(present & ~filling)
+        self._warm[streams] = True
+
+        # Full blocks start again at the beginning of their row
+        lengths = self._current_lengths[streams]
+        lengths[lengths == self.window_size] = 0
+        self._current_windows[streams, lengths] = x[streams]
+        self._current_lengths[streams] = lengths + 1
+
+        streams = streams[self._current_lengths[streams] == self.window_size]
+        if streams.size == 0:
+            return self.drift_detected
+
+        stats, p_values = ks_2samp_rows(self._reference_windows[streams], self._current_windows[streams])
+
+        drift = streams[(p_values < self.alpha) & (stats > 0.1)]
+        self._reference_windows[drift] = self._current_windows[drift]
+        self.drift_detected[drift] = True
+
+        return self.drift_detected
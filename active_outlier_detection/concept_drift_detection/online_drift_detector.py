@@ -0,0 +1,76 @@
+from abc import abstractmethod
+
+import numpy as np
+
+from utils import instrumentation
+from .base_block_drift_detector import BaseBlockDriftDetector
+
+
+class OnlineDriftDetector(BaseBlockDriftDetector):
+    """
+    Base of the detectors that update their statistic on every element, instead of
+    testing once per block. Elements still go through the block windows the pipeline
+    fits and scores, but a drift closes the current block right away: the reference
+    becomes the last window_size elements and the next element starts a new block.
+    """
+    def __init__(self, window_size=50):
+        super().__init__(window_size)
+        # Ring buffer with the last window_size elements
+        self._recent_buffer = np.empty(window_size, dtype=np.float64)
+        self._recent_position = 0
+        self._block_closed = False
+
+    @property
+    def recent_window(self) -> np.ndarray:
+        """
+        Last window_size elements, oldest first.
+        """
+        return np.roll(self._recent_buffer, -self._recent_position)
+
+    def detect_drift(self, x) -> bool:
+        self.drift_detected = False
+        evicted = self._recent_buffer[self._recent_position]
+        self._recent_buffer[self._recent_position] = x
+        self._recent_position = (self._recent_position + 1) % self.window_size
+
+        if not self.is_reference_full():
+            self._append_reference(x)
+            if self.is_reference_full():
+                self._start()
+            return self.drift_detected
+
+        if self._block_closed:
+            self._current_length = 0
+            self._block_closed = False
+        self._append_current(x)
+
+        has_drift = self._update(x, evicted)
+        if not self.warm:
+            # The pipeline trains on the reference window first, so the element
+            # warming the detector up is left for the statistic to settle
+            self._warm = True
+        elif has_drift:
+            self.drift_detected = True
+            instrumentation.count('drifts')
+
+            np.copyto(self._reference_buffer, self.recent_window)
+            self._block_closed = True
+            self._start()
+
+        return self.drift_detected
+
+    @abstractmethod
+    def _start(self):
+        """
+        Called when the reference window gets full and after every drift, with the new reference.
+        """
+
+    @abstractmethod
+    def _update(self, x, evicted) -> bool:
+        """
+        Updates the statistic with a new element.
+
+        :param x: new element
+        :param evicted: element that left the last window_size elements with x
+        :return: whether the statistic detects drift
+        """
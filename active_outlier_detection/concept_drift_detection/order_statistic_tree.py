@@ -0,0 +1,146 @@
+import random
+
+
+class _Node:
+    __slots__ = ('key', 'priority', 'left', 'right', 'weight', 'count', 'total', 'max_prefix', 'min_prefix')
+
+    def __init__(self, key, priority, weight, count):
+        self.key = key
+        self.priority = priority
+        self.left = None
+        self.right = None
+        self.weight = weight
+        self.count = count
+        self.total = weight
+        self.max_prefix = weight
+        self.min_prefix = weight
+
+
+def _update(node):
+    left, right = node.left, node.right
+
+    prefix = node.weight
+    max_prefix = min_prefix = prefix
+    if left is not None:
+        prefix += left.total
+        max_prefix = max(left.max_prefix, prefix)
+        min_prefix = min(left.min_prefix, prefix)
+
+    total = prefix
+    if right is not None:
+        total += right.total
+        max_prefix = max(max_prefix, prefix + right.max_prefix)
+        min_prefix = min(min_prefix, prefix + right.min_prefix)
+
+    node.total = total
+    node.max_prefix = max_prefix
+    node.min_prefix = min_prefix
+
+
+def _rotate_right(node):
+    pivot = node.left
+    node.left = pivot.right
+    pivot.right = node
+    _update(node)
+    _update(pivot)
+
+    return pivot
+
+
+def _rotate_left(node):
+    pivot = node.right
+    node.right = pivot.left
+    pivot.left = node
+    _update(node)
+    _update(pivot)
+
+    return pivot
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+class OrderStatisticTree:
+    """
+    Treap keyed by value, where every distinct value carries a weight and the number of
+    elements with that value. Every node keeps the sum of the weights of its subtree and
+    the maximum and minimum of its prefix sums, taken after each distinct value, so the
+    extremes of the prefix sums of the whole tree are kept up to date in O(log n) per
+    insertion or removal.
+
+    With weight +1 for the elements of one sample and -1 for the ones of another of the same
+    size n, the largest absolute prefix sum is n times their KS statistic, ties included.
+    """
+    def __init__(self, seed=0):
+        self._root = None
+        self._random = random.Random(seed)
+
+    def add(self, key, weight, count=1):
+        """
+        Adds count elements equal to key with the given total weight. A negative count removes
+        elements, and values are dropped from the tree when none of their elements are left.
+        """
+        self._root = self._add(self._root, key, weight, count)
+
+    def max_abs_prefix(self):
+        """
+        :return: largest absolute prefix sum of the weights in key order, 0 for an empty tree
+        """
+        if self._root is None:
+            return 0
+
+        return max(self._root.max_prefix, -self._root.min_prefix, 0)
+
+    def _add(self, node, key, weight, count):
+        if node is None:
+            return _Node(key, self._random.random(), weight, count)
+
+        if key == node.key:
+            node.weight += weight
+            node.count += count
+            if node.count <= 0:
+                return _merge(node.left, node.right)
+        elif key < node.key:
+            node.left = self._add(node.left, key, weight, count)
+            if node.left is not None and node.left.priority > node.priority:
+                return _rotate_right(node)
+        else:
+            node.right = self._add(node.right, key, weight, count)
+            if node.right is not None and node.right.priority > node.priority:
+                return _rotate_left(node)
+
+        _update(node)
+        return node
+
+    def __getstate__(self):
+        # Stored as (key, weight, count) triples in key order, as deep trees can exceed the recursion limit of pickle
+        return {'items': list(self._items(self._root)), 'random': self._random}
+
+    def __setstate__(self, state):
+        self._root = None
+        self._random = state['random']
+        for key, weight, count in state['items']:
+            self.add(key, weight, count)
+
+    def _items(self, node):
+        stack = []
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.key, node.weight, node.count
+            node = node.right
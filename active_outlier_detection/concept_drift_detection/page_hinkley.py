@@ -0,0 +1,58 @@
+from .online_drift_detector import OnlineDriftDetector
+
+
+class PageHinkley(OnlineDriftDetector):
+    """
+    Two-sided Page-Hinkley test, O(1) per element. It accumulates the deviations of the
+    elements from their running mean since the last drift, and detects drift when the
+    cumulative deviation rises or falls more than threshold from its extreme.
+
+    Elements are measured in standard deviations of the reference window, so delta and
+    threshold do not depend on the scale of the series.
+    """
+    def __init__(self, window_size=50, delta=0.005, threshold=50.0, forgetting_factor=0.9999):
+        """
+        :param delta: magnitude of the changes that are tolerated
+        :param threshold: cumulative deviation from which there is drift
+        :param forgetting_factor: weight of the past deviations, 1 to never forget them
+        """
+        super().__init__(window_size)
+        self.delta = delta
+        self.threshold = threshold
+        self.forgetting_factor = forgetting_factor
+
+        self._scale = 1.0
+        self._n = 0
+        self._mean = 0.0
+        self._sum_increase = 0.0
+        self._min_increase = 0.0
+        self._sum_decrease = 0.0
+        self._min_decrease = 0.0
+
+    def _start(self):
+        std = self.reference_window.std()
+        self._scale = 1.0 / std if std > 0 else 1.0
+
+        self._n = 0
+        self._mean = 0.0
+        self._sum_increase = 0.0
+        self._min_increase = 0.0
+        self._sum_decrease = 0.0
+        self._min_decrease = 0.0
+
+    def _update(self, x, evicted) -> bool:
+        x = x * self._scale
+        self._n += 1
+        self._mean += (x - self._mean) / self._n
+
+        self._sum_increase = self.forgetting_factor * self._sum_increase + x - self._mean - self.delta
+        self._min_increase = min(self._min_increase, self._sum_increase)
+        self._sum_decrease = self.forgetting_factor * self._sum_decrease + self._mean - x - self.delta
+        self._min_decrease = min(self._min_decrease, self._sum_decrease)
+
+        # Wait for a whole window, so the running mean is meaningful
+        if self._n < self.window_size:
+            return False
+
+        return (self._sum_increase - self._min_increase > self.threshold
+                or self._sum_decrease - self._min_decrease > self.threshold)
@@ -0,0 +1,34 @@
+from .ks_engine import _p_value_equal_sizes
+from .online_drift_detector import OnlineDriftDetector
+from .order_statistic_tree import OrderStatisticTree
+
+
+class SlidingKSWIN(OnlineDriftDetector):
+    """
+    KS test between the reference window and a window sliding over the last window_size
+    elements, made on every element instead of once per block. Both windows live in an
+    OrderStatisticTree, with weight +1 for the reference and -1 for the sliding window,
+    so the statistic is updated in O(log window_size) per element instead of recomputed.
+
+    As with KSBLWIN, there is drift when the p-value is below alpha and the statistic above 0.1.
+    Testing on every element makes more tests than KSBLWIN does, so alpha should be lower.
+    """
+    def __init__(self, window_size=50, alpha=0.005):
+        super().__init__(window_size)
+        self.alpha = alpha
+        self._tree = OrderStatisticTree()
+
+    def _start(self):
+        # Right after a drift, the sliding window is the new reference
+        self._tree = OrderStatisticTree()
+        for x in self.reference_window.tolist():
+            self._tree.add(x, 0, 2)
+
+    def _update(self, x, evicted) -> bool:
+        # Python floats compare much faster than numpy scalars in the tree
+        self._tree.add(float(evicted), 1, -1)
+        self._tree.add(float(x), -1, 1)
+
+        h = self._tree.max_abs_prefix()
+
+        return h > 0.1 * self.window_size and _p_value_equal_sizes(self.window_size, h) < self.alpha
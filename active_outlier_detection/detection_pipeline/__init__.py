@@ -1 +1,11 @@
-from .ksblwin_iforest import KSBLWINIForest
+from utils.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'KSBLWINIForest': '.ksblwin_iforest',
+    'ResultSink': '.result_sink',
+    'ScoringQueue': '.scoring_queue',
+    'KSBLWINIForestSweep': '.sweep',
+    'SweepResult': '.sweep',
+    'StreamingScorer': '.streaming_scorer',
+    'HalfSpaceTrees': '.half_space_trees',
+})
@@ -0,0 +1,155 @@
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    from sklearn.ensemble._iforest import _average_path_length
+except ImportError:
+    _average_path_length = None
+
+TREE_LEAF = -1
+
+
+def _path_lengths(X, roots, feature, threshold, children_left, children_right, leaf_depth):
+    """
+    Traverses every tree for every sample and returns the sum over the trees
+    of the depth of the leaf reached plus its path length correction.
+    """
+    n_samples = X.shape[0]
+    depths = np.zeros(n_samples)
+    for i in range(n_samples):
+        depth = 0.0
+        for root in roots:
+            node = root
+            while children_left[node] != TREE_LEAF:
+                if X[i, feature[node]] <= threshold[node]:
+                    node = children_left[node]
+                else:
+                    node = children_right[node]
+            depth += leaf_depth[node]
+        depths[i] = depth
+
+    return depths
+
+
+def _path_lengths_per_tree(X, roots, feature, threshold, children_left, children_right, leaf_depth):
+    """
+    Same as _path_lengths, but keeping the depth reached in every tree apart.
+    """
+    n_samples = X.shape[0]
+    depths = np.zeros((n_samples, roots.shape[0]))
+    for i in range(n_samples):
+        for tree_idx in range(roots.shape[0]):
+            node = roots[tree_idx]
+            while children_left[node] != TREE_LEAF:
+                if X[i, feature[node]] <= threshold[node]:
+                    node = children_left[node]
+                else:
+                    node = children_right[node]
+            depths[i, tree_idx] = leaf_depth[node]
+
+    return depths
+
+
+if njit is not None:
+    _path_lengths = njit(cache=True, nogil=True)(_path_lengths)
+    _path_lengths_per_tree = njit(cache=True, nogil=True)(_path_lengths_per_tree)
+
+
+class CompiledIForest:
+    """
+    Flat-array copy of a fitted IsolationForest. All the trees are laid out
+    one after another in the same arrays and scored by a single compiled kernel,
+    giving the same values as IsolationForest.score_samples without its
+    per-call overhead.
+    """
+    def __init__(self, iforest):
+        estimators = iforest.estimators_
+        node_counts = [estimator.tree_.node_count for estimator in estimators]
+        offsets = np.concatenate([[0], np.cumsum(node_counts)[:-1]]).astype(np.int64)
+
+        feature = []
+        children_left = []
+        children_right = []
+        leaf_depth = []
+        for tree_idx, (estimator, features, offset) in enumerate(
+                zip(estimators, iforest.estimators_features_, offsets)):
+            tree = estimator.tree_
+            is_leaf = tree.children_left == TREE_LEAF
+
+            # Leaves keep the feature of sklearn (-2), so only map split nodes
+            feature.append(np.where(is_leaf, 0, np.asarray(features)[np.maximum(tree.feature, 0)]))
+            children_left.append(np.where(is_leaf, TREE_LEAF, tree.children_left + offset))
+            children_right.append(np.where(is_leaf, TREE_LEAF, tree.children_right + offset))
+            leaf_depth.append(
+                iforest._decision_path_lengths[tree_idx]
+                + iforest._average_path_length_per_tree[tree_idx]
+                - 1.0
+            )
+
+        self.n_features = iforest.n_features_in_
+        self._roots = offsets
+        self._feature = np.concatenate(feature).astype(np.int64)
+        self._threshold = np.concatenate([e.tree_.threshold for e in estimators]).astype(np.float64)
+        self._children_left = np.concatenate(children_left).astype(np.int64)
+        self._children_right = np.concatenate(children_right).astype(np.int64)
+        self._leaf_depth = np.concatenate(leaf_depth).astype(np.float64)
+        self._average_path_length_max_samples = _average_path_length([iforest._max_samples])
+        self._denominator = len(estimators) * self._average_path_length_max_samples
+
+    @staticmethod
+    def is_supported(iforest) -> bool:
+        return (njit is not None
+                and _average_path_length is not None
+                and hasattr(iforest, "_decision_path_lengths")
+                and hasattr(iforest, "_average_path_length_per_tree"))
+
+    def score_samples(self, X) -> np.ndarray:
+        """
+        :param X: array of shape (n_samples, n_features)
+        :return: same output as IsolationForest.score_samples
+        """
+        depths = _path_lengths(self._as_input(X), *self._arrays())
+
+        return self._scores(depths, self._denominator)
+
+    def score_samples_prefixes(self, X, n_trees) -> np.ndarray:
+        """
+        Scores X with the forests made of the first k trees, for every k in n_trees. As
+        IsolationForest draws the seeds of its trees in order, each of them is the same as
+        score_samples of an IsolationForest with k trees and the same random_state.
+
+        :param X: array of shape (n_samples, n_features)
+        :param n_trees: numbers of trees, each at most the number of trees of the forest
+        :return: array of shape (len(n_trees), n_samples)
+        """
+        depths = np.cumsum(_path_lengths_per_tree(self._as_input(X), *self._arrays()), axis=1)
+
+        return np.stack([
+            self._scores(depths[:, k - 1], k * self._average_path_length_max_samples) for k in n_trees
+        ])
+
+    def _as_input(self, X):
+        # sklearn compares float32 inputs against float64 thresholds
+        return np.asarray(X, dtype=np.float32).reshape(-1, self.n_features)
+
+    def _arrays(self):
+        return (
+            self._roots,
+            self._feature,
+            self._threshold,
+            self._children_left,
+            self._children_right,
+            self._leaf_depth,
+        )
+
+    @staticmethod
+    def _scores(depths, denominator):
+        scores = 2 ** (
+            -np.divide(depths, denominator, out=np.ones_like(depths), where=denominator != 0)
+        )
+
+        return -scores
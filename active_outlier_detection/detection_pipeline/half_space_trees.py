@@ -0,0 +1,174 @@
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+from .streaming_scorer import StreamingScorer
+
+
+def _reference_mass(mass, previous_mass, mass_epoch, epoch, tree, node):
+    # Masses are rolled over lazily, the first time a node is learned in a new window
+    node_epoch = mass_epoch[tree, node]
+    if node_epoch == epoch:
+        return previous_mass[tree, node]
+    if node_epoch == epoch - 1:
+        return mass[tree, node]
+
+    return 0
+
+
+def _score_learn(X, learn, feature, split, mass, previous_mass, mass_epoch, state, height, window_size):
+    """
+    Scores every sample of X with the masses of the reference window and, if learn, adds it to
+    the masses of the latest window. When the latest window gets window_size samples, it becomes
+    the reference one.
+
+    :param state: array with the current window, the number of samples in it and in the reference window
+    """
+    n_trees = feature.shape[0]
+    scores = np.zeros(X.shape[0])
+    for i in range(X.shape[0]):
+        epoch = state[0]
+        reference_count = state[2]
+        size_limit = 0.1 * reference_count
+
+        score = 0.0
+        for tree in range(n_trees):
+            node = 0
+            for depth in range(height + 1):
+                reference_mass = _reference_mass(mass, previous_mass, mass_epoch, epoch, tree, node)
+                score += reference_mass * 2.0 ** depth
+                if reference_mass < size_limit or depth == height:
+                    break
+
+                if X[i, feature[tree, node]] < split[tree, node]:
+                    node = 2 * node + 1
+                else:
+                    node = 2 * node + 2
+
+        max_score = n_trees * reference_count * (2.0 ** (height + 1) - 1)
+        scores[i] = 1.0 - score / max_score if max_score > 0 else 0.0
+
+        if not learn:
+            continue
+
+        for tree in range(n_trees):
+            node = 0
+            for depth in range(height + 1):
+                if mass_epoch[tree, node] != epoch:
+                    previous = mass[tree, node] if mass_epoch[tree, node] == epoch - 1 else 0
+                    previous_mass[tree, node] = previous
+                    mass[tree, node] = 0
+                    mass_epoch[tree, node] = epoch
+                mass[tree, node] += 1
+
+                if depth == height:
+                    break
+                if X[i, feature[tree, node]] < split[tree, node]:
+                    node = 2 * node + 1
+                else:
+                    node = 2 * node + 2
+
+        state[1] += 1
+        if state[1] == window_size:
+            state[0] += 1
+            state[2] = state[1]
+            state[1] = 0
+
+    return scores
+
+
+if njit is not None:
+    _reference_mass = njit(cache=True, nogil=True, inline='always')(_reference_mass)
+    _score_learn = njit(cache=True, nogil=True)(_score_learn)
+
+
+class HalfSpaceTrees(StreamingScorer):
+    """
+    Half-Space Trees (Tan, Ting and Liu, 2011). Every tree halves a random work range around
+    the data at each level, and counts how many samples of the reference and of the latest
+    window fall in each node. Samples are scored by the mass of the reference window along
+    their path, sparse regions being anomalous, and learned into the latest window, which
+    replaces the reference one every window_size samples. Scoring and learning a sample are
+    O(n_trees * height), and windows are rolled over lazily node by node, so there is no
+    per-window cost.
+
+    Samples are scaled to the range of the data given to fit, so the trees fit the series
+    whatever its level. As the trees do not depend on the data, they are only drawn on the
+    first fit, and later fits only rescale the samples and reset the masses.
+    """
+    def __init__(self, n_trees=25, height=8, window_size=250, random_state=None):
+        self.n_trees = n_trees
+        self.height = height
+        self.window_size = window_size
+        self._random_state = np.random.default_rng(random_state)
+
+        self._minimum = None
+        self._span = None
+        self._feature = None
+        self._split = None
+        self._mass = None
+        self._previous_mass = None
+        self._mass_epoch = None
+        self._state = None
+
+    def fit(self, X):
+        X = np.asarray(X, dtype=np.float64).reshape(len(X), -1)
+        self._minimum = X.min(axis=0)
+        span = X.max(axis=0) - self._minimum
+        self._span = np.where(span > 0, span, 1.0)
+
+        if self._feature is None:
+            self._build_trees(X.shape[1])
+
+        n_nodes = 2 ** (self.height + 1) - 1
+        self._mass = np.zeros((self.n_trees, n_nodes), dtype=np.int64)
+        self._previous_mass = np.zeros((self.n_trees, n_nodes), dtype=np.int64)
+        # Nodes start as last learned two windows ago, so their masses read as zero
+        self._mass_epoch = np.full((self.n_trees, n_nodes), -2, dtype=np.int64)
+        self._state = np.zeros(3, dtype=np.int64)
+
+        # The samples of X are the reference window until window_size new ones are learned
+        _score_learn(self._scale(X), True, self._feature, self._split, self._mass, self._previous_mass,
+                     self._mass_epoch, self._state, self.height, len(X))
+
+    def score_learn_many(self, X, learn=True) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(self._minimum))
+
+        return _score_learn(self._scale(X), learn, self._feature, self._split, self._mass, self._previous_mass,
+                            self._mass_epoch, self._state, self.height, self.window_size)
+
+    def _scale(self, X):
+        return np.ascontiguousarray((X - self._minimum) / self._span)
+
+    def _build_trees(self, n_features):
+        """
+        Draws the split feature of every internal node and halves its work range on it.
+        Work ranges start around a random point of the unit range, wide enough to cover it.
+        """
+        n_internal = 2 ** self.height - 1
+        n_nodes = 2 ** (self.height + 1) - 1
+        self._feature = np.zeros((self.n_trees, n_nodes), dtype=np.int64)
+        self._split = np.zeros((self.n_trees, n_nodes), dtype=np.float64)
+
+        for tree in range(self.n_trees):
+            s = self._random_state.uniform(size=n_features)
+            half_width = 2 * np.maximum(s, 1 - s)
+            low = np.zeros((n_nodes, n_features))
+            high = np.zeros((n_nodes, n_features))
+            low[0] = s - half_width
+            high[0] = s + half_width
+
+            for node in range(n_internal):
+                feature = self._random_state.integers(n_features)
+                split = (low[node, feature] + high[node, feature]) / 2
+                self._feature[tree, node] = feature
+                self._split[tree, node] = split
+
+                for child in (2 * node + 1, 2 * node + 2):
+                    low[child] = low[node]
+                    high[child] = high[node]
+                high[2 * node + 1, feature] = split
+                low[2 * node + 2, feature] = split
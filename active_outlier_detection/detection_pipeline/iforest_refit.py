@@ -0,0 +1,46 @@
+from dataclasses import dataclass
+
+import numpy as np
+from sklearn.base import clone
+
+
+@dataclass(frozen=True)
+class RefitReport:
+    n_trees: int
+    seconds: float
+
+
+def can_replace_trees(iforest) -> bool:
+    return (hasattr(iforest, "_seeds")
+            and hasattr(iforest, "_decision_path_lengths")
+            and hasattr(iforest, "_average_path_length_per_tree"))
+
+
+def replace_oldest_trees(iforest, X, n_trees, random_state=None):
+    """
+    Fits n_trees new trees on X and swaps them in place of the n_trees
+    oldest trees of a fitted IsolationForest, which are the first ones
+    of its estimators_.
+
+    :param iforest: fitted IsolationForest, modified in place
+    :param X: training data for the new trees
+    :param n_trees: number of trees to replace
+    :param random_state: random state of the new trees
+    """
+    new_trees = clone(iforest).set_params(n_estimators=n_trees, random_state=random_state, warm_start=False)
+    new_trees.fit(X)
+
+    iforest.estimators_ = iforest.estimators_[n_trees:] + new_trees.estimators_
+    iforest.estimators_features_ = iforest.estimators_features_[n_trees:] + new_trees.estimators_features_
+    iforest._seeds = np.concatenate([iforest._seeds[n_trees:], new_trees._seeds])
+    iforest._decision_path_lengths = \
+        tuple(iforest._decision_path_lengths[n_trees:]) + tuple(new_trees._decision_path_lengths)
+    iforest._average_path_length_per_tree = \
+        tuple(iforest._average_path_length_per_tree[n_trees:]) + tuple(new_trees._average_path_length_per_tree)
+    iforest._max_samples = new_trees._max_samples
+    iforest.max_samples_ = new_trees.max_samples_
+
+    if iforest.contamination == "auto":
+        iforest.offset_ = -0.5
+    else:
+        iforest.offset_ = np.percentile(iforest.score_samples(X), 100.0 * iforest.contamination)
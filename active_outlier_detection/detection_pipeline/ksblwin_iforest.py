@@ -1,65 +1,386 @@
+import pickle
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+
 import numpy as np
 from sklearn.ensemble import IsolationForest
+from sklearn.utils import check_random_state
 
-from active_outlier_detection.concept_drift_detection import KSBLWIN
+from active_outlier_detection.concept_drift_detection import (
+    ADWIN, KSBLWIN, BaseBlockDriftDetector, PageHinkley, SlidingKSWIN)
+from utils import instrumentation
+from .compiled_iforest import CompiledIForest
+from .half_space_trees import HalfSpaceTrees
+from .iforest_refit import RefitReport, can_replace_trees, replace_oldest_trees
+from .names import DETECTORS, SCORERS
+from .result_sink import ResultSink
+from .scoring_queue import ScoringQueue
+from .streaming_scorer import StreamingScorer
 
 
 class KSBLWINIForest:
+    DETECTORS = DETECTORS
+    SCORERS = SCORERS
+    # Reports of the last refits kept, as a long-running pipeline refits without end and is snapshotted with them
+    MAX_REFIT_REPORTS = 100
+
     def __init__(self,
                  outlier_threshold=0.75,
                  n_estimators=100,
                  contamination="auto",
                  window_size=50,
-                 alpha=0.01):
+                 alpha=0.01,
+                 ks_engine="scipy",
+                 compiled_scoring=True,
+                 refit_fraction=1.0,
+                 model_cache=None,
+                 cache_refits=False,
+                 random_state=None,
+                 detector="ksblwin",
+                 scorer="iforest",
+                 scoring_queue=None):
+        if not 0 < refit_fraction <= 1:
+            raise ValueError(f"Refit fraction must be in (0, 1], got {refit_fraction}")
+
+        # Name of one of DETECTORS, built with window_size and alpha, or a detector instance.
+        # Online detectors retrain as soon as they detect drift instead of at the end of a block
+        self.detector = self._make_detector(detector, window_size, alpha, ks_engine)
+        # Without a seed, the forest still gets its own random state instead of numpy's global one,
+        # so snapshots carry it and a restored pipeline draws the same trees as an uninterrupted one
+        if random_state is None:
+            random_state = np.random.RandomState()
+        self.iforest = IsolationForest(contamination=contamination, n_estimators=n_estimators,
+                                       random_state=random_state)
 
-        self.ksblwin = KSBLWIN(window_size, alpha)
-        self.iforest = IsolationForest(contamination=contamination, n_estimators=n_estimators)
+        # With a streaming scorer, a name of SCORERS other than iforest or a StreamingScorer instance,
+        # every element is scored as soon as it arrives instead of once its window is full
+        self.scorer = self._make_scorer(scorer, random_state)
 
         self.outlier_threshold = outlier_threshold
         self.is_model_trained = False
 
+        # Number of elements fed to the pipeline so far
+        self.offset = 0
+
+        self.compiled_scoring = compiled_scoring
+        self._compiled_iforest = None
+
+        # Fraction of the trees replaced on drift, oldest first. 1.0 retrains the whole forest
+        self.refit_fraction = refit_fraction
+        # Reports of the last MAX_REFIT_REPORTS refits, and totals over all of them
+        self.refit_reports: deque[RefitReport] = deque(maxlen=KSBLWINIForest.MAX_REFIT_REPORTS)
+        self.n_refits = 0
+        self.refit_seconds = 0.0
+        self._refit_random_state = None
+
+        # Object with a fit(model, X) method fitting the model, such as models.ModelCache, to reuse
+        # forests already fitted on the same reference window. Only the first fit goes through it
+        # unless cache_refits is set, as refits after drift are rarely repeated and would each be stored
+        self.model_cache = model_cache
+        self.cache_refits = cache_refits
+
+        # ScoringQueue to score the windows between two refits in batches.
+        # Outputs of the windows in the queue, oldest first, are lists that get their scores when flushed
+        self.scoring_queue: ScoringQueue | None = scoring_queue
+        self._queued = deque()
+
     def run_pipe(self, x) -> np.ndarray | None:
         """
         Runs the pipeline of concept drift detection and
         isolation forest scoring.
 
         :param x: element to be added to the window
-        :return: scores if window is full, None otherwise
+        :return: scores if window is full, None otherwise. With a streaming scorer,
+            scores of x and, right after warming up, of the reference window before it.
+            With a scoring queue, scores of the windows scored since the last call, in order,
+            None if there are none, and flush returns the ones still in the queue
+        """
+        with instrumentation.stage('pipeline'):
+            has_drift = self.detector.detect_drift(x)
+            self.offset += 1
+            instrumentation.count('samples')
+
+            if self.scorer is not None:
+                return self._score_stream(np.array([x], dtype=np.float64), has_drift)
+
+            return self._score(has_drift)
+
+    def run_batch(self, values, sink=None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Runs the pipeline over a whole array of elements, window by window.
+        The output is the same as concatenating the non-None outputs of
+        run_pipe called on each element, so scores[i] and labels[i] belong
+        to the i-th element fed to the pipeline.
+
+        :param values: 1D array of elements to be added to the window
+        :param sink: ResultSink to append the outputs to, in the row of this pipeline's window size
+        :return: scores and labels of every element whose window has been scored
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        window_size = self.detector.window_size
+
+        if sink is None:
+            # Windows completed by this batch may start with elements of previous batches
+            sink = ResultSink(len(values) + window_size, [window_size])
+        start = sink.written(window_size)
+
+        with instrumentation.stage('pipeline'):
+            position = 0
+            while position < len(values):
+                consumed, has_drift = self.detector.detect_drift_many(values[position:])
+                chunk = values[position:position + consumed]
+                position += consumed
+
+                if self.scorer is not None:
+                    window_scores, window_labels = self._score_stream(chunk, has_drift)
+                else:
+                    window_scores, window_labels = self._score(has_drift)
+                if window_scores is not None:
+                    sink.append(window_size, window_scores, window_labels)
+
+            if self.scoring_queue is not None:
+                window_scores, window_labels = self.flush()
+                if window_scores is not None:
+                    sink.append(window_size, window_scores, window_labels)
+
+            self.offset += len(values)
+            instrumentation.count('samples', len(values))
+
+        return sink.scores(window_size)[start:], sink.labels(window_size)[start:]
+
+    def run_batches(self, chunks: Iterable, sink=None) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        """
+        Runs the pipeline over consecutive chunks of elements, keeping the
+        state between them.
+
+        :param chunks: iterable of 1D arrays of elements
+        :param sink: ResultSink to append the outputs to
+        :return: generator of run_batch outputs, one per chunk
+        """
+        for chunk in chunks:
+            yield self.run_batch(chunk, sink)
+
+    def flush(self) -> tuple[np.ndarray | None, np.ndarray | None]:
+        """
+        Scores the windows of this pipeline still in the scoring queue.
+
+        :return: scores and labels of the windows not returned yet, in order, or None if there are none
+        """
+        if self.scoring_queue is not None and self._queued:
+            self.scoring_queue.flush(self._scoring_model())
+
+        return self._ready()
+
+    def snapshot(self) -> bytes:
+        """
+        :return: binary snapshot of the whole state of the pipeline, including the
+            fitted model and the offset, but not the model cache nor the scoring queue.
+            Windows in the scoring queue are scored first, and returned by the restored pipeline
+        """
+        if self.scoring_queue is not None and self._queued:
+            self.scoring_queue.flush(self._scoring_model())
+
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def restore(snapshot, model_cache=None, scoring_queue=None) -> "KSBLWINIForest":
+        pipeline = pickle.loads(snapshot)
+        pipeline.model_cache = model_cache
+        pipeline.scoring_queue = scoring_queue
+
+        return pipeline
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The compiled forest is rebuilt from the fitted one on restore
+        state['_compiled_iforest'] = None
+        state['model_cache'] = None
+        state['scoring_queue'] = None
+
+        return state
+
+    def __setstate__(self, state):
+        # Snapshots taken before refit reports were bounded keep all of them in a list
+        if not isinstance(state['refit_reports'], deque):
+            reports = state['refit_reports']
+            state['refit_reports'] = deque(reports, maxlen=KSBLWINIForest.MAX_REFIT_REPORTS)
+            state['n_refits'] = len(reports)
+            state['refit_seconds'] = sum(report.seconds for report in reports)
+
+        self.__dict__.update(state)
+        if self.is_model_trained and self.scorer is None:
+            self._compile()
+
+    @staticmethod
+    def _make_detector(detector, window_size, alpha, ks_engine) -> BaseBlockDriftDetector:
+        if isinstance(detector, BaseBlockDriftDetector):
+            return detector
+
+        if detector == "ksblwin":
+            return KSBLWIN(window_size, alpha, ks_engine)
+        if detector == "sliding_ks":
+            return SlidingKSWIN(window_size, alpha)
+        if detector == "adwin":
+            return ADWIN(window_size)
+        if detector == "page_hinkley":
+            return PageHinkley(window_size)
+
+        raise ValueError(f"Detector {detector} not available. Available detectors: {KSBLWINIForest.DETECTORS}")
+
+    @staticmethod
+    def _make_scorer(scorer, random_state) -> StreamingScorer | None:
+        if isinstance(scorer, StreamingScorer):
+            return scorer
+
+        if scorer == "iforest":
+            return None
+        if scorer == "hst":
+            return HalfSpaceTrees(random_state=check_random_state(random_state).randint(np.iinfo(np.int32).max))
+
+        raise ValueError(f"Scorer {scorer} not available. Available scorers: {KSBLWINIForest.SCORERS}")
+
+    def _score_stream(self, chunk, has_drift):
+        """
+        Scores the elements just fed to the detector with the streaming scorer, which learns
+        each one after scoring it. Drift restarts the scorer on the new reference window.
+        Only the last element of chunk can have detected drift.
         """
-        has_drift = self.ksblwin.detect_drift(x)
+        if not self.detector.warm:
+            return None, None
+
+        parts = []
+        if not self.is_model_trained:
+            # The last element of chunk warmed the detector up, the rest are in the reference window
+            ref_win = np.reshape(self.detector.reference_window, (-1, 1))
+            with instrumentation.stage('fit'):
+                self.scorer.fit(ref_win)
+            self.is_model_trained = True
+
+            parts.append(self.scorer.score_many(ref_win))
+            chunk = chunk[-1:]
+
+        if has_drift:
+            with instrumentation.stage('score'):
+                parts.append(self.scorer.score_learn_many(chunk[:-1].reshape(-1, 1)))
+            with instrumentation.stage('refit'):
+                self.scorer.fit(np.reshape(self.detector.reference_window, (-1, 1)))
+
+            # The element that detected drift is already in the new reference window
+            chunk = chunk[-1:]
+
+        with instrumentation.stage('score'):
+            parts.append(self.scorer.score_learn_many(chunk.reshape(-1, 1), learn=not has_drift))
+
+        scores = np.concatenate(parts)
+        labels = scores >= self.outlier_threshold
+
+        return scores, labels
 
-        if not self.is_model_trained and not self.ksblwin.warm:
+    def _score(self, has_drift):
+        if not self.is_model_trained and not self.detector.warm:
             # If model is not trained and reference window is not full, do not score
             return None, None
 
-        if not self.is_model_trained and self.ksblwin.warm:
+        if not self.is_model_trained and self.detector.warm:
             # If model is not trained and reference window is full, train the model
-            ref_win = self.ksblwin.reference_window
+            ref_win = self.detector.reference_window
 
             ref_win = np.reshape(ref_win, (-1, 1))
-            self.iforest.fit(ref_win)
+            self._fit(ref_win)
             self.is_model_trained = True
 
-            scores = np.abs(self.iforest.score_samples(ref_win))
-            labels = scores >= self.outlier_threshold
-            return scores, labels
+            return self._score_window(ref_win)
 
-        if not has_drift and not self.ksblwin.is_window_full():
+        if not has_drift and not self.detector.is_window_full():
             # If window is not full, do not score
             return None, None
 
         if has_drift:
             # If drift is detected, retrain the model with the new reference window
-            ref_win = self.ksblwin.reference_window
+            ref_win = self.detector.reference_window
 
             ref_win = np.reshape(ref_win, (-1, 1))
-            self.iforest.fit(ref_win)
+            self._refit(ref_win)
 
         # If window is full, score the window
-        window = self.ksblwin.current_window
+        window = self.detector.current_window
         window = np.reshape(window, (-1, 1))
 
-        scores = np.abs(self.iforest.score_samples(window))
-        labels = scores >= self.outlier_threshold
+        return self._score_window(window)
 
-        return scores, labels
+    def _score_window(self, window):
+        if self.scoring_queue is None:
+            scores = np.abs(self._score_samples(window))
+            return scores, scores >= self.outlier_threshold
+
+        # The detector reuses its window buffers, so the queue gets a copy
+        output = []
+        self._queued.append(output)
+        self.scoring_queue.submit(self._scoring_model(), np.array(window), output.append)
+
+        return self._ready()
+
+    def _ready(self):
+        """
+        Pops the outputs of the oldest windows that have been scored, up to the first one still in the queue.
+        """
+        parts = []
+        while self._queued and self._queued[0]:
+            parts.append(self._queued.popleft()[0])
+
+        if not parts:
+            return None, None
+
+        scores = np.abs(np.concatenate(parts))
+        return scores, scores >= self.outlier_threshold
+
+    def _scoring_model(self):
+        return self._compiled_iforest if self._compiled_iforest is not None else self.iforest
+
+    def _fit(self, X, cache=True):
+        with instrumentation.stage('fit'):
+            if cache and self.model_cache is not None:
+                self.model_cache.fit(self.iforest, X)
+            else:
+                self.iforest.fit(X)
+        self._compile()
+
+    def _refit(self, X):
+        # Refits change the forest in place, so windows of the current one are scored first
+        if self.scoring_queue is not None and self._queued:
+            self.scoring_queue.flush(self._scoring_model())
+
+        start = time.perf_counter()
+
+        with instrumentation.stage('refit'):
+            n_trees = len(self.iforest.estimators_)
+            n_replaced = max(1, int(round(self.refit_fraction * n_trees)))
+            if n_replaced >= n_trees or not can_replace_trees(self.iforest):
+                n_replaced = self.iforest.n_estimators
+                self._fit(X, cache=self.cache_refits)
+            else:
+                if self._refit_random_state is None:
+                    self._refit_random_state = check_random_state(self.iforest.random_state)
+
+                seed = self._refit_random_state.randint(np.iinfo(np.int32).max)
+                replace_oldest_trees(self.iforest, X, n_replaced, seed)
+                self._compile()
+
+        seconds = time.perf_counter() - start
+        self.refit_reports.append(RefitReport(n_replaced, seconds))
+        self.n_refits += 1
+        self.refit_seconds += seconds
+
+    def _compile(self):
+        if self.compiled_scoring and CompiledIForest.is_supported(self.iforest):
+            self._compiled_iforest = CompiledIForest(self.iforest)
+        else:
+            self._compiled_iforest = None
+
+    def _score_samples(self, X):
+        with instrumentation.stage('score'):
+            if self._compiled_iforest is not None:
+                return self._compiled_iforest.score_samples(X)
+
+            return self.iforest.score_samples(X)
@@ -0,0 +1,4 @@
+# Names of the drift detectors and scorers of KSBLWINIForest, kept apart from it so
+# command line interfaces can offer them as choices without importing scikit-learn
+DETECTORS = ("ksblwin", "adwin", "page_hinkley", "sliding_ks")
+SCORERS = ("iforest", "hst")
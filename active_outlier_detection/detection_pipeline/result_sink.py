@@ -0,0 +1,130 @@
+import json
+import os
+
+import numpy as np
+
+
+class ResultSink:
+    """
+    Preallocated scores and labels of a series for several window sizes, in one
+    (n_window_sizes, length) block per output. Pipelines append their outputs
+    to the row of their window size, so no intermediate copies are made.
+
+    With a path, the block lives in memory-mapped files that are flushed every
+    flush_every appended elements, and can be opened again with ResultSink.open:
+        sink.json    length of the series and window sizes
+        scores.npy   float64 scores, NaN where nothing has been scored
+        labels.npy   bool labels
+        lengths.npy  int64 number of elements written in each row
+    """
+    METADATA_FILE = 'sink.json'
+    FLUSH_EVERY = 1 << 20
+
+    def __init__(self, length, window_sizes, path=None, flush_every=FLUSH_EVERY):
+        self.length = length
+        self.window_sizes = list(window_sizes)
+        self.path = path
+        self.flush_every = flush_every
+
+        self._rows = {window_size: row for row, window_size in enumerate(self.window_sizes)}
+        self._unflushed = 0
+
+        shape = (len(self.window_sizes), length)
+        if path is None:
+            self._scores = np.full(shape, np.nan, dtype=np.float64)
+            self._labels = np.zeros(shape, dtype=bool)
+            self._lengths = np.zeros(len(self.window_sizes), dtype=np.int64)
+            return
+
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, ResultSink.METADATA_FILE), 'w') as f:
+            json.dump({'length': length, 'window_sizes': self.window_sizes}, f)
+
+        self._scores = self._open_memmap('scores', 'w+', np.float64, shape)
+        self._scores[:] = np.nan
+        self._labels = self._open_memmap('labels', 'w+', bool, shape)
+        self._lengths = self._open_memmap('lengths', 'w+', np.int64, (len(self.window_sizes),))
+        self.flush()
+
+    @classmethod
+    def open(cls, path, flush_every=FLUSH_EVERY):
+        """
+        Opens an existing sink from disk, to keep writing to it or to read it.
+        """
+        with open(os.path.join(path, ResultSink.METADATA_FILE)) as f:
+            metadata = json.load(f)
+
+        sink = cls.__new__(cls)
+        sink.length = metadata['length']
+        sink.window_sizes = metadata['window_sizes']
+        sink.path = path
+        sink.flush_every = flush_every
+        sink._rows = {window_size: row for row, window_size in enumerate(sink.window_sizes)}
+        sink._unflushed = 0
+        sink._scores = np.load(os.path.join(path, 'scores.npy'), mmap_mode='r+')
+        sink._labels = np.load(os.path.join(path, 'labels.npy'), mmap_mode='r+')
+        sink._lengths = np.load(os.path.join(path, 'lengths.npy'), mmap_mode='r+')
+
+        return sink
+
+    @classmethod
+    def open_or_create(cls, length, window_sizes, path, flush_every=FLUSH_EVERY):
+        """
+        Opens the sink at path if it has the same length and window sizes, creates it otherwise.
+        """
+        metadata_path = os.path.join(path, ResultSink.METADATA_FILE)
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as f:
+                metadata = json.load(f)
+
+            if metadata['length'] == length and metadata['window_sizes'] == list(window_sizes):
+                return cls.open(path, flush_every)
+
+        return cls(length, window_sizes, path, flush_every)
+
+    def append(self, window_size, scores, labels):
+        row = self._rows[window_size]
+        start = self._lengths[row]
+        end = start + len(scores)
+        if end > self.length:
+            raise ValueError(f"Sink of length {self.length} is full for window size {window_size}")
+
+        self._scores[row, start:end] = scores
+        self._labels[row, start:end] = labels
+        self._lengths[row] = end
+
+        self._unflushed += len(scores)
+        if self.path is not None and self._unflushed >= self.flush_every:
+            self.flush()
+
+    def scores(self, window_size) -> np.ndarray:
+        row = self._rows[window_size]
+        return self._scores[row, :self._lengths[row]]
+
+    def labels(self, window_size) -> np.ndarray:
+        row = self._rows[window_size]
+        return self._labels[row, :self._lengths[row]]
+
+    def written(self, window_size) -> int:
+        return int(self._lengths[self._rows[window_size]])
+
+    def truncate(self, window_size, length):
+        """
+        Discards the outputs of window_size written after the first length elements.
+        """
+        row = self._rows[window_size]
+        self._scores[row, length:self._lengths[row]] = np.nan
+        self._labels[row, length:self._lengths[row]] = False
+        self._lengths[row] = length
+
+    def flush(self):
+        self._unflushed = 0
+        if self.path is None:
+            return
+
+        self._scores.flush()
+        self._labels.flush()
+        self._lengths.flush()
+
+    def _open_memmap(self, name, mode, dtype, shape):
+        return np.lib.format.open_memmap(os.path.join(self.path, f'{name}.npy'), mode=mode, dtype=dtype, shape=shape)
@@ -0,0 +1,116 @@
+import time
+
+import numpy as np
+
+from utils import instrumentation
+
+
+class ScoringQueue:
+    """
+    Collects the windows that pipelines have to score and scores them in as few calls as
+    possible. Pending windows are grouped by model, and every group is scored in a single
+    score_samples call on their concatenation, so the fixed cost of a call is paid once per
+    flush instead of once per window of window_size samples.
+
+    Windows of a pipeline share its model between two refits, so those are the windows that
+    get batched: every KSBLWINIForest fits its own forest, so windows of different pipelines
+    land in different groups even when they share the queue, and a process pool gives every
+    worker a copy of the queue. Pipelines flush the windows of their model before refitting
+    it, as refits change the model in place.
+
+    The queue is flushed when it holds max_batch_size samples, or when the oldest pending
+    window has waited max_latency seconds, which is checked on every submit and poll.
+    Scores of every window are passed to its callback, in the order the windows were
+    submitted for the same model.
+    """
+    def __init__(self, max_batch_size=10_000, max_latency=1.0, clock=time.monotonic):
+        """
+        :param max_batch_size: number of pending samples from which the queue is flushed
+        :param max_latency: seconds a window may wait before the queue is flushed, None for no limit
+        :param clock: function returning the current time in seconds
+        """
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self._clock = clock
+
+        # id(model) -> (model, [(X, callback), ...]), in submission order
+        self._pending = {}
+        self._size = 0
+        self._oldest = None
+
+        # Number of score_samples calls and of windows scored by them
+        self.calls = 0
+        self.windows = 0
+
+    def __len__(self) -> int:
+        """
+        Number of pending samples.
+        """
+        return self._size
+
+    def submit(self, model, X, callback):
+        """
+        Queues the samples X of a window to be scored by model.
+
+        :param model: object with a score_samples(X) method, such as an IsolationForest
+        :param X: array of shape (n_samples, n_features)
+        :param callback: function called with the scores of X once they are computed
+        """
+        _, windows = self._pending.setdefault(id(model), (model, []))
+        windows.append((X, callback))
+
+        self._size += len(X)
+        if self._oldest is None:
+            self._oldest = self._clock()
+
+        if self._size >= self.max_batch_size:
+            self.flush()
+        else:
+            self.poll()
+
+    def poll(self) -> bool:
+        """
+        Flushes the queue if its oldest window has waited max_latency seconds.
+
+        :return: whether the queue was flushed
+        """
+        if self._oldest is None or self.max_latency is None or self._clock() - self._oldest < self.max_latency:
+            return False
+
+        self.flush()
+        return True
+
+    def flush(self, model=None):
+        """
+        Scores the pending windows of model, or of every model if not given.
+        """
+        keys = list(self._pending) if model is None else [id(model)]
+        for key in keys:
+            if key not in self._pending:
+                continue
+
+            model, windows = self._pending.pop(key)
+            self._size -= sum(len(X) for X, _ in windows)
+            self._score(model, windows)
+
+        if not self._pending:
+            self._oldest = None
+
+    def _score(self, model, windows):
+        X = np.concatenate([X for X, _ in windows]) if len(windows) > 1 else windows[0][0]
+        with instrumentation.stage('score'):
+            scores = model.score_samples(X)
+
+        self.calls += 1
+        self.windows += len(windows)
+        instrumentation.count('score_calls')
+
+        boundaries = np.cumsum([len(X) for X, _ in windows[:-1]])
+        for (_, callback), window_scores in zip(windows, np.split(scores, boundaries)):
+            callback(window_scores)
+
+    def __getstate__(self):
+        if self._pending:
+            raise ValueError("Cannot pickle a scoring queue with pending windows, flush it first")
+
+        return self.__dict__.copy()
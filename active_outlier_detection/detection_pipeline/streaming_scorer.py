@@ -0,0 +1,31 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class StreamingScorer(ABC):
+    """
+    Anomaly scorer updated one sample at a time, so every reading can be scored as soon as
+    it arrives instead of once its window is full. Scores are in [0, 1], higher meaning more
+    anomalous, like the absolute IsolationForest scores of the pipeline.
+    """
+    @abstractmethod
+    def fit(self, X):
+        """
+        Starts a new model from the samples of X, of shape (n_samples, n_features),
+        discarding everything learned before.
+        """
+
+    @abstractmethod
+    def score_learn_many(self, X, learn=True) -> np.ndarray:
+        """
+        Scores the samples of X one after another, learning each one after scoring it,
+        so the score of a sample depends on the ones before it.
+
+        :param X: array of shape (n_samples, n_features)
+        :param learn: False to only score the samples
+        :return: scores of the samples
+        """
+
+    def score_many(self, X) -> np.ndarray:
+        return self.score_learn_many(X, learn=False)
@@ -0,0 +1,153 @@
+import itertools
+from dataclasses import dataclass
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+from sklearn.metrics import auc, precision_recall_fscore_support, roc_curve
+
+from active_outlier_detection.concept_drift_detection import KSBLWIN
+from .compiled_iforest import CompiledIForest
+
+
+@dataclass(frozen=True)
+class SweepResult:
+    window_size: int
+    alpha: float
+    n_estimators: int
+    outlier_threshold: float
+    roc_auc: float
+    precision: float
+    recall: float
+    f1: float
+
+
+@dataclass(frozen=True)
+class Segment:
+    """
+    A model fitted on values[fit_start:fit_start + window_size] scoring
+    the windows starting at score_starts, until the next drift.
+    """
+    fit_start: int
+    score_starts: list[int]
+
+
+class KSBLWINIForestSweep:
+    """
+    Evaluates KSBLWINIForest over a grid of (window_size, alpha, n_estimators,
+    outlier_threshold) on a series, sharing work between configurations:
+        - The drift segmentation is computed once per (window_size, alpha)
+        - Each segment fits a single forest with the largest n_estimators, and
+          smaller forests are scored with its first n_estimators trees
+        - Thresholds are applied to the scores afterwards
+    With a fixed random_state, every configuration gets the same scores
+    as running KSBLWINIForest on its own.
+    """
+    def __init__(self,
+                 window_sizes=(50,),
+                 alphas=(0.01,),
+                 n_estimators=(100,),
+                 outlier_thresholds=(0.75,),
+                 contamination="auto",
+                 ks_engine="scipy",
+                 random_state=None):
+        self.window_sizes = list(window_sizes)
+        self.alphas = list(alphas)
+        self.n_estimators = sorted(n_estimators)
+        self.outlier_thresholds = list(outlier_thresholds)
+        self.contamination = contamination
+        self.ks_engine = ks_engine
+        self.random_state = random_state
+
+    def run(self, values, ground_truth) -> list[SweepResult]:
+        """
+        :param values: 1D array with the series
+        :param ground_truth: boolean array with the actual outliers of the series
+        :return: one result per configuration of the grid. Configurations whose window size leaves
+            no window scored, as the series is shorter than it, get NaN metrics
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        ground_truth = np.asarray(ground_truth, dtype=bool)
+
+        results = []
+        for window_size, alpha in itertools.product(self.window_sizes, self.alphas):
+            segments = self.segment(values, window_size, alpha)
+            scores = self._score_segments(values, window_size, segments)
+            y_true = ground_truth[:scores.shape[1]]
+
+            if not len(y_true):
+                results.extend(
+                    SweepResult(window_size, alpha, n_estimators, outlier_threshold, np.nan, np.nan, np.nan, np.nan)
+                    for n_estimators, outlier_threshold in itertools.product(
+                        self.n_estimators, self.outlier_thresholds))
+                continue
+
+            for n_estimators, prefix_scores in zip(self.n_estimators, scores):
+                fpr, tpr, _ = roc_curve(y_true, prefix_scores)
+                roc_auc = auc(fpr, tpr)
+
+                for outlier_threshold in self.outlier_thresholds:
+                    precision, recall, f1, _ = precision_recall_fscore_support(
+                        y_true,
+                        prefix_scores >= outlier_threshold,
+                        average='binary',
+                        zero_division=0)
+
+                    results.append(SweepResult(
+                        window_size, alpha, n_estimators, outlier_threshold, roc_auc, precision, recall, f1))
+
+        return results
+
+    def segment(self, values, window_size, alpha) -> list[Segment]:
+        """
+        Runs the drift detector over the series, following the same steps
+        KSBLWINIForest does, and returns where each model is fitted and
+        which windows it scores.
+        """
+        detector = KSBLWIN(window_size, alpha, self.ks_engine)
+
+        segments = []
+        position = 0
+        while position < len(values):
+            consumed, has_drift = detector.detect_drift_many(values[position:])
+            position += consumed
+
+            if not segments:
+                if detector.warm:
+                    # The first model is fitted on the first window and scores it
+                    segments.append(Segment(0, [0]))
+                continue
+
+            if not has_drift and not detector.is_window_full():
+                continue
+
+            # The current window is always made of the last window_size consumed elements
+            window_start = position - window_size
+            if has_drift:
+                segments.append(Segment(window_start, [window_start]))
+            else:
+                segments[-1].score_starts.append(window_start)
+
+        return segments
+
+    def _score_segments(self, values, window_size, segments) -> np.ndarray:
+        """
+        :return: array of shape (len(n_estimators), n_scored) with the scores of every n_estimators
+        """
+        n_scored = sum(len(segment.score_starts) for segment in segments) * window_size
+        scores = np.empty((len(self.n_estimators), n_scored))
+
+        position = 0
+        for segment in segments:
+            iforest = IsolationForest(
+                n_estimators=self.n_estimators[-1],
+                contamination=self.contamination,
+                random_state=self.random_state)
+            iforest.fit(values[segment.fit_start:segment.fit_start + window_size].reshape(-1, 1))
+
+            windows = np.concatenate([values[start:start + window_size] for start in segment.score_starts])
+            segment_scores = CompiledIForest(iforest).score_samples_prefixes(windows, self.n_estimators)
+
+            scores[:, position:position + len(windows)] = np.abs(segment_scores)
+            position += len(windows)
+
+        return scores
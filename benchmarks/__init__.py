@@ -0,0 +1,11 @@
+from utils.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'SyntheticSeries': '.synthetic',
+    'generate_series': '.synthetic',
+    'write_readings_csv': '.synthetic',
+    'BENCHMARKS': '.suite',
+    'BenchmarkResult': '.suite',
+    'compare': '.suite',
+    'run_benchmarks': '.suite',
+})
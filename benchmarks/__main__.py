@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import tabulate
+
+from .suite import BENCHMARKS, compare, load_station_series, run_benchmarks
+
+
+def main():
+    args = parse_args()
+
+    workdir = args.workdir or os.path.join(tempfile.gettempdir(), 'outliers-detection-benchmarks')
+    series = load_station_series(args.data_path, args.station) if args.station else None
+    results = run_benchmarks(
+        args.benchmarks,
+        args.lengths,
+        workdir,
+        seed=args.seed,
+        measure_memory=not args.no_memory,
+        pipeline_params={'n_estimators': args.n_trees, 'window_size': args.window_size},
+        series=series)
+    results['station'] = args.station
+
+    print(tabulate.tabulate(
+        [[r['name'], r['length'], r['throughput'], r['latency_unit'], r['latency_p50'], r['latency_p95'],
+          r['latency_p99'], r['peak_memory_bytes'], r['roc_auc']] for r in results['results']],
+        headers=['Benchmark', 'Length', 'Elements/s', 'Latency per', 'p50 (s)', 'p95 (s)', 'p99 (s)',
+                 'Peak memory (B)', 'ROC AUC'],
+        tablefmt='github'))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'Regression in {regression}')
+
+        if regressions:
+            sys.exit(1)
+        print('No regressions against the baseline')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the drift detector, the pipeline and CSV parsing on synthetic river level series.')
+
+    parser.add_argument(
+        '-b',
+        '--benchmarks',
+        type=str,
+        nargs='+',
+        choices=list(BENCHMARKS),
+        default=list(BENCHMARKS),
+        help='Benchmarks to run. All of them by default.')
+
+    parser.add_argument(
+        '-n',
+        '--lengths',
+        type=int,
+        nargs='+',
+        default=[10_000],
+        help='Lengths of the synthetic series, from 10k up to 10M readings. 10000 by default.')
+
+    parser.add_argument(
+        '-o',
+        '--output',
+        type=str,
+        default=None,
+        help='JSON file to write the results to, which can be used as the baseline of later runs.')
+
+    parser.add_argument(
+        '--baseline',
+        type=str,
+        default=None,
+        help='JSON file with the results of a previous run to compare against. '
+             'Exits with an error if there are regressions.')
+
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.1,
+        help='Fraction by which throughput may drop, or peak memory grow, before being a regression. '
+             '0.1 by default.')
+
+    parser.add_argument(
+        '--no_memory',
+        action='store_true',
+        help='Set this to skip measuring peak memory, which runs every benchmark a second time.')
+
+    parser.add_argument(
+        '-w',
+        '--window_size',
+        type=int,
+        default=50,
+        help='Window size of the detectors and pipelines. 50 by default.')
+
+    parser.add_argument(
+        '-t',
+        '--n_trees',
+        type=int,
+        default=100,
+        help='Number of trees of the Isolation Forests. 100 by default.')
+
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='Seed of the synthetic series. 0 by default.')
+
+    parser.add_argument(
+        '-s',
+        '--station',
+        type=str,
+        default=None,
+        help='Station whose stored readings to benchmark on instead of the synthetic series, '
+             'in which case the lengths are ignored.')
+
+    parser.add_argument(
+        '-d',
+        '--data_path',
+        type=str,
+        default=os.getcwd(),
+        help='Path of the stored readings of the station. Current working directory by default.')
+
+    parser.add_argument(
+        '--workdir',
+        type=str,
+        default=None,
+        help='Directory for the CSV files of the benchmarks. A directory in the temporary one by default.')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main()
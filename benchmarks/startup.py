@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Commands that must start without importing any of HEAVY_MODULES: help, argument errors and invalid dates
+COMMANDS = {
+    'main_help': ['main.py', '--help'],
+    'detect_help': ['main.py', 'detect', '--help'],
+    'detect_bad_dates': ['main.py', 'detect', '2023-13-01', '2023-01-02', '-s', 'Station'],
+    'plot_bad_dates': ['main.py', 'plot', '2023-13-01', '2023-01-02', '-s', 'Station'],
+    'fetch_bad_dates': ['-m', 'data_fetch', '2023-13-01', '2023-01-02', '-s', 'Station'],
+    'runner_help': ['-m', 'runner', '--help'],
+}
+HEAVY_MODULES = ('numpy', 'pandas', 'scipy', 'sklearn', 'matplotlib', 'seaborn', 'numba', 'pyod', 'requests', 'pyarrow')
+# Startups of tens of milliseconds vary by about as much between runs, so smaller slowdowns are not regressions
+MIN_REGRESSION_SECONDS = 0.05
+
+_IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+@dataclass(frozen=True)
+class StartupResult:
+    name: str
+    command: list[str]
+    # Wall time of the whole process, in seconds
+    seconds_min: float
+    seconds_median: float
+    # Time spent importing modules, in seconds, as reported by -X importtime
+    import_seconds: float
+    # HEAVY_MODULES imported by the command, which should be none
+    heavy_modules: list[str]
+
+
+def measure(command, repeats=5) -> StartupResult:
+    """
+    Runs a command of COMMANDS repeats times with python -X importtime from the repository.
+
+    :param command: name of the command
+    """
+    args = COMMANDS[command]
+    env = {**os.environ, 'PYTHONPATH': REPO_PATH}
+
+    seconds = []
+    stderr = ''
+    for _ in range(repeats):
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', *args],
+            cwd=REPO_PATH, env=env, capture_output=True, text=True)
+        seconds.append(time.perf_counter() - start)
+        stderr = process.stderr
+
+    import_us = 0
+    imported = set()
+    for line in stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match is None:
+            continue
+
+        _, cumulative, indent, name = match.groups()
+        imported.add(name.split('.')[0])
+        # Top-level imports include the time of the ones they trigger
+        if not indent:
+            import_us += int(cumulative)
+
+    return StartupResult(
+        command,
+        args,
+        min(seconds),
+        statistics.median(seconds),
+        import_us / 1e6,
+        sorted(imported.intersection(HEAVY_MODULES)))
+
+
+def run_startup_benchmarks(names=None, repeats=5) -> dict:
+    """
+    :param names: names of the commands, keys of COMMANDS. All of them by default
+    :return: JSON-serializable dictionary with the environment and the results
+    """
+    results = [measure(name, repeats) for name in names or COMMANDS]
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+        },
+        'repeats': repeats,
+        'results': [asdict(result) for result in results],
+    }
+
+
+def compare(results, baseline=None, tolerance=0.5) -> list[str]:
+    """
+    Checks that no command imports heavy modules and, with a baseline run, that their
+    startup time has not grown by more than tolerance and MIN_REGRESSION_SECONDS. The fastest
+    run of every command is compared, as it is the least disturbed by the rest of the machine.
+
+    :return: description of every regression
+    """
+    baseline_results = {result['name']: result for result in (baseline or {'results': []})['results']}
+
+    regressions = []
+    for result in results['results']:
+        if result['heavy_modules']:
+            regressions.append(f"{result['name']} imports {', '.join(result['heavy_modules'])}")
+
+        base = baseline_results.get(result['name'])
+        if (base is not None and result['seconds_min'] > base['seconds_min'] * (1 + tolerance)
+                and result['seconds_min'] - base['seconds_min'] > MIN_REGRESSION_SECONDS):
+            regressions.append(
+                f"{result['name']}: startup {result['seconds_min']:.3f} s, baseline {base['seconds_min']:.3f} s")
+
+    return regressions
+
+
+def main():
+    args = parse_args()
+
+    results = run_startup_benchmarks(args.commands, args.repeats)
+    for result in results['results']:
+        heavy = ', '.join(result['heavy_modules']) or '-'
+        print(f"{result['name']:<20} median {result['seconds_median']:.3f} s  min {result['seconds_min']:.3f} s  "
+              f"imports {result['import_seconds']:.3f} s  heavy modules {heavy}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f'Regression in {regression}')
+
+    if regressions:
+        sys.exit(1)
+    print('No regressions')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Measure the startup time of the command line interfaces, and check that help, argument '
+                    'errors and invalid dates do not import pandas, scikit-learn or matplotlib.')
+
+    parser.add_argument(
+        '-c',
+        '--commands',
+        type=str,
+        nargs='+',
+        choices=list(COMMANDS),
+        default=None,
+        help='Commands to measure. All of them by default.')
+
+    parser.add_argument(
+        '-r',
+        '--repeats',
+        type=int,
+        default=5,
+        help='Runs of every command. 5 by default.')
+
+    parser.add_argument(
+        '-o',
+        '--output',
+        type=str,
+        default=None,
+        help='JSON file to write the results to, which can be used as the baseline of later runs.')
+
+    parser.add_argument(
+        '--baseline',
+        type=str,
+        default=None,
+        help='JSON file with the results of a previous run to compare the startup times against.')
+
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.5,
+        help='Fraction by which the startup time may grow before being a regression. 0.5 by default.')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+import os
+import platform
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.metrics import roc_auc_score
+
+from active_outlier_detection.concept_drift_detection import KSBLWIN
+from active_outlier_detection.detection_pipeline import KSBLWINIForest, ScoringQueue
+from data_fetch import Requester, StationStore
+from .synthetic import SyntheticSeries, generate_series, write_readings_csv
+
+# Elements per batch of the batch benchmarks, whose latencies are per batch
+BATCH_SIZE = 10_000
+WARM_UP_LENGTH = 1_000
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    name: str
+    length: int
+    seconds: float
+    # Elements per second
+    throughput: float
+    # Latencies are per element in streaming benchmarks and per batch or parsed chunk otherwise
+    latency_unit: str
+    latency_p50: float
+    latency_p95: float
+    latency_p99: float
+    latency_max: float
+    # Peak of the memory allocated while running, None if not measured
+    peak_memory_bytes: int | None
+    # ROC AUC of the scores against the outliers of the series, None for benchmarks that do not score
+    roc_auc: float | None = None
+
+
+def _drift_streaming(series, workdir, params):
+    values = series.values.to_numpy(dtype=np.float64)
+
+    def run():
+        detector = KSBLWIN(params['window_size'], params['alpha'], params['ks_engine'])
+        latencies = np.empty(len(values))
+        for i, x in enumerate(values):
+            start = time.perf_counter()
+            detector.detect_drift(x)
+            latencies[i] = time.perf_counter() - start
+
+        return latencies, None
+
+    return 'element', run
+
+
+def _drift_batch(series, workdir, params):
+    values = series.values.to_numpy(dtype=np.float64)
+
+    def run():
+        detector = KSBLWIN(params['window_size'], params['alpha'], params['ks_engine'])
+        latencies = []
+        for batch_start in range(0, len(values), BATCH_SIZE):
+            batch = values[batch_start:batch_start + BATCH_SIZE]
+
+            start = time.perf_counter()
+            position = 0
+            while position < len(batch):
+                consumed, _ = detector.detect_drift_many(batch[position:])
+                position += consumed
+            latencies.append(time.perf_counter() - start)
+
+        return latencies, None
+
+    return 'batch', run
+
+
+def _pipeline_streaming(series, workdir, params, scorer='iforest', max_batch_size=None):
+    values = series.values.to_numpy(dtype=np.float64)
+
+    def run():
+        scoring_queue = ScoringQueue(max_batch_size, max_latency=None) if max_batch_size else None
+        pipeline = KSBLWINIForest(**params, scorer=scorer, scoring_queue=scoring_queue)
+        latencies = np.empty(len(values))
+        scores = []
+        for i, x in enumerate(values):
+            start = time.perf_counter()
+            x_scores, _ = pipeline.run_pipe(x)
+            if i == len(values) - 1 and scoring_queue is not None:
+                # Windows still in the queue are scored with the last element
+                last_scores, _ = pipeline.flush()
+                x_scores = last_scores if x_scores is None else np.concatenate([x_scores, last_scores])
+            latencies[i] = time.perf_counter() - start
+
+            if x_scores is not None:
+                scores.append(x_scores)
+
+        return latencies, np.concatenate(scores)
+
+    return 'element', run
+
+
+def _pipeline_batch(series, workdir, params, scorer='iforest'):
+    values = series.values.to_numpy(dtype=np.float64)
+
+    def run():
+        pipeline = KSBLWINIForest(**params, scorer=scorer)
+        latencies = []
+        scores = []
+        for batch_start in range(0, len(values), BATCH_SIZE):
+            start = time.perf_counter()
+            batch_scores, _ = pipeline.run_batch(values[batch_start:batch_start + BATCH_SIZE])
+            latencies.append(time.perf_counter() - start)
+            scores.append(batch_scores)
+
+        return latencies, np.concatenate(scores)
+
+    return 'batch', run
+
+
+def _csv_load(series, workdir, params):
+    # Writing the CSV is not measured, and it is reused by later runs of the same length
+    path = os.path.join(workdir, f'readings_{len(series.values)}.csv')
+    if not os.path.exists(path):
+        write_readings_csv(series, path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    def run():
+        latencies = []
+        with open(path, 'rb') as f:
+            start = time.perf_counter()
+            for _ in Requester.parse_chunks(f):
+                now = time.perf_counter()
+                latencies.append(now - start)
+                start = now
+
+        return latencies, None
+
+    return 'chunk', run
+
+
+BENCHMARKS = {
+    'drift_streaming': _drift_streaming,
+    'drift_batch': _drift_batch,
+    'pipeline_streaming': _pipeline_streaming,
+    'pipeline_batch': _pipeline_batch,
+    # Same pipeline with the Half-Space Trees streaming scorer instead of IsolationForest
+    'pipeline_hst_streaming': partial(_pipeline_streaming, scorer='hst'),
+    'pipeline_hst_batch': partial(_pipeline_batch, scorer='hst'),
+    # IsolationForest pipeline fed one element at a time, scoring windows in batches of BATCH_SIZE elements
+    'pipeline_queue_streaming': partial(_pipeline_streaming, max_batch_size=BATCH_SIZE),
+    'csv_load': _csv_load,
+}
+
+DEFAULT_PIPELINE_PARAMS = {
+    'window_size': 50,
+    'alpha': 0.01,
+    'ks_engine': 'fast',
+    'n_estimators': 100,
+    'random_state': 0,
+}
+
+
+def load_station_series(data_path, station_name) -> SyntheticSeries:
+    """
+    Loads the stored readings of a station as a series to benchmark on. As there are no labels,
+    outliers are the readings with an absolute z-score of at least 3, as in the main script.
+    """
+    values = StationStore(data_path, station_name).load()['value'].astype(np.float64)
+    z_score = (values - values.mean()) / values.std()
+
+    return SyntheticSeries(values, (z_score.abs() >= 3).to_numpy(), np.empty(0, dtype=np.int64))
+
+
+def run_benchmarks(names, lengths, workdir, seed=0, measure_memory=True, pipeline_params=None, series=None) -> dict:
+    """
+    Runs every benchmark on synthetic series of every length. Each benchmark is run once
+    to measure its time and latencies, and once more under tracemalloc for its peak memory,
+    as tracing allocations slows it down. One-time costs, such as compiling the numba kernels,
+    are paid beforehand on a short series.
+
+    :param names: names of the benchmarks, keys of BENCHMARKS
+    :param lengths: lengths of the synthetic series
+    :param workdir: directory for the files benchmarks read, such as CSVs
+    :param pipeline_params: keyword arguments of the detectors and pipelines
+    :param series: SyntheticSeries-like series to run on instead of synthetic ones, such as the
+        readings of a station, in which case lengths are ignored
+    :return: JSON-serializable dictionary with the environment and the results
+    """
+    params = {**DEFAULT_PIPELINE_PARAMS, **(pipeline_params or {})}
+    os.makedirs(workdir, exist_ok=True)
+
+    warm_up = generate_series(WARM_UP_LENGTH, seed=seed)
+    for name in names:
+        BENCHMARKS[name](warm_up, workdir, params)[1]()
+
+    all_series = [series] if series is not None else (generate_series(length, seed=seed) for length in lengths)
+
+    results = []
+    for series in all_series:
+        length = len(series.values)
+        for name in names:
+            latency_unit, run = BENCHMARKS[name](series, workdir, params)
+
+            start = time.perf_counter()
+            latencies, scores = run()
+            seconds = time.perf_counter() - start
+            latencies = np.asarray(latencies, dtype=np.float64)
+
+            roc_auc = None
+            y_true = series.outliers[:len(scores)] if scores is not None else None
+            if y_true is not None and 0 < y_true.sum() < len(y_true):
+                roc_auc = roc_auc_score(y_true, scores)
+
+            peak_memory = None
+            if measure_memory:
+                tracemalloc.start()
+                try:
+                    run()
+                    peak_memory = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+
+            results.append(BenchmarkResult(
+                name,
+                length,
+                seconds,
+                length / seconds,
+                latency_unit,
+                *np.percentile(latencies, [50, 95, 99]).tolist(),
+                float(latencies.max()),
+                peak_memory,
+                roc_auc))
+
+            print(f'{name} on {length} elements: {length / seconds:.0f} elements/s')
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'scikit-learn': sklearn.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+        },
+        'params': {**params, 'seed': seed, 'batch_size': BATCH_SIZE},
+        'results': [asdict(result) for result in results],
+    }
+
+
+def compare(results, baseline, tolerance=0.1) -> list[str]:
+    """
+    Compares the results of run_benchmarks with the ones of a baseline run, matching
+    them by benchmark name and length.
+
+    :param tolerance: fraction by which throughput may drop, or peak memory grow, before being a regression
+    :return: description of every regression
+    """
+    baseline_results = {(result['name'], result['length']): result for result in baseline['results']}
+
+    regressions = []
+    for result in results['results']:
+        base = baseline_results.get((result['name'], result['length']))
+        if base is None:
+            continue
+
+        label = f"{result['name']} on {result['length']} elements"
+        if result['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(
+                f"{label}: throughput {result['throughput']:.0f} elements/s, "
+                f"baseline {base['throughput']:.0f} elements/s")
+
+        if (result['peak_memory_bytes'] is not None and base['peak_memory_bytes'] is not None
+                and result['peak_memory_bytes'] > base['peak_memory_bytes'] * (1 + tolerance)):
+            regressions.append(
+                f"{label}: peak memory {result['peak_memory_bytes']} bytes, "
+                f"baseline {base['peak_memory_bytes']} bytes")
+
+    return regressions
@@ -0,0 +1,89 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+READINGS_PER_DAY = 96
+
+
+@dataclass(frozen=True)
+class SyntheticSeries:
+    """
+    values: river levels every 15 minutes, indexed by dateTime
+    outliers: boolean array with the injected outliers
+    drifts: positions where the regime of the series changes
+    """
+    values: pd.Series
+    outliers: np.ndarray
+    drifts: np.ndarray
+
+
+def generate_series(length,
+                    n_drifts=10,
+                    outlier_rate=0.001,
+                    base_level=1.0,
+                    seed=0,
+                    end='2024-01-01') -> SyntheticSeries:
+    """
+    Generates a synthetic river level series made of a yearly and a daily cycle,
+    AR(1) noise and rain events that raise the level and decay exponentially.
+    Drifts change the level and the noise of the series from their position on,
+    and outliers are isolated spikes of several standard deviations.
+
+    :param length: number of readings
+    :param n_drifts: number of drifts, at random positions
+    :param outlier_rate: fraction of the readings that are outliers
+    :param end: timestamp of the last reading. The series goes back from it, as the 10M readings
+        of the longest benchmarks already span almost three centuries
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(length, dtype=np.float64)
+
+    seasonal = 0.3 * np.sin(2 * np.pi * t / (365 * READINGS_PER_DAY)) \
+        + 0.02 * np.sin(2 * np.pi * t / READINGS_PER_DAY)
+
+    # Drifts split the series in regimes with their own offset and noise scale
+    drifts = np.sort(rng.choice(np.arange(1, length), size=min(n_drifts, length - 1), replace=False))
+    regimes = np.searchsorted(drifts, t, side='right')
+    offsets = np.concatenate([[0.0], rng.normal(0, 0.5, len(drifts))])
+    scales = np.concatenate([[1.0], rng.uniform(0.5, 2.0, len(drifts))])
+
+    noise = lfilter([1.0], [1.0, -0.9], rng.normal(0, 0.01, length)) * scales[regimes]
+
+    # Rain events: impulses of random height decaying over about a day
+    rain = np.zeros(length)
+    n_events = max(1, length // (30 * READINGS_PER_DAY))
+    rain[rng.integers(0, length, n_events)] = rng.exponential(0.5, n_events)
+    rain = lfilter([1.0], [1.0, -np.exp(-1 / READINGS_PER_DAY)], rain)
+
+    values = base_level + seasonal + offsets[regimes] + noise + rain
+
+    outliers = np.zeros(length, dtype=bool)
+    n_outliers = int(round(outlier_rate * length))
+    positions = rng.choice(length, size=n_outliers, replace=False)
+    outliers[positions] = True
+    values[positions] += rng.choice([-1, 1], n_outliers) * rng.uniform(5, 10, n_outliers) * values.std()
+
+    index = pd.date_range(end=end, periods=length, freq='15min', name='dateTime')
+
+    return SyntheticSeries(pd.Series(values.astype(np.float32), index=index, name='value'), outliers, drifts)
+
+
+def write_readings_csv(series, path, chunk_rows=1_000_000):
+    """
+    Writes the series as a readings CSV of the hydrology API, as parsed by Requester.
+    """
+    with open(path, 'w') as f:
+        f.write('measure,dateTime,date,value,completeness,quality,qcode\n')
+        for start in range(0, len(series.values), chunk_rows):
+            chunk = series.values.iloc[start:start + chunk_rows]
+            pd.DataFrame({
+                'measure': 'synthetic-level-i-900-m-qualified',
+                'dateTime': chunk.index.strftime('%Y-%m-%dT%H:%M:%S'),
+                'date': chunk.index.strftime('%Y-%m-%d'),
+                'value': chunk.to_numpy(),
+                'completeness': '',
+                'quality': 'Good',
+                'qcode': '',
+            }).to_csv(f, header=False, index=False)
@@ -1 +1,6 @@
-from .requester import Requester
+from utils.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'Requester': '.requester',
+    'StationStore': '.store',
+})
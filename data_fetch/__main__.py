@@ -3,14 +3,14 @@ import argparse
 from pathlib import Path
 
 from utils import dates
-from .requester import Requester
+from utils.arguments import positive_int
 
 
 def main():
     args = parse_args()
 
-    station_names, data_path = \
-        args.station_names, args.data_path
+    station_names, data_path, workers = \
+        args.station_names, args.data_path, args.workers
     start_date, end_date = \
         dates.parse_dates(args.start_date, args.end_date)
 
@@ -18,9 +18,12 @@ def main():
 
     os.makedirs(data_path, exist_ok=True)
 
-    req = Requester(station_names, data_path, start_date.date(), end_date.date())
+    # Imported once the arguments are valid, as it imports pandas
+    from .requester import Requester
 
-    req.do_request()
+    req = Requester(station_names, data_path, start_date.date(), end_date.date(), max_workers=workers)
+
+    req.fetch()
 
 
 def parse_args():
@@ -51,6 +54,13 @@ def parse_args():
         default=os.getcwd(),
         help='The path to store the data. Current working directory by default.')
 
+    parser.add_argument(
+        '-j',
+        '--workers',
+        type=positive_int,
+        default=1,
+        help='Number of stations to request concurrently. 1 by default.')
+
     return parser.parse_args()
 
 
@@ -1,13 +1,70 @@
+import contextlib
+import io
+import json
+import threading
+
 import requests
 import os
 
-from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
+from requests.adapters import HTTPAdapter
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_exponential
+
+from utils import instrumentation
+from .store import StationStore
+
+
+def _is_retryable(exception):
+    # ChunkedEncodingError is raised when the connection drops in the middle of a streamed body
+    if isinstance(exception, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)):
+        return True
+
+    if isinstance(exception, requests.HTTPError) and exception.response is not None:
+        return exception.response.status_code == 429 or exception.response.status_code >= 500
+
+    return False
+
+
+def _utc(timestamps):
+    # Naive timestamps are taken as UTC, aware ones are converted to it
+    return timestamps.tz_localize('UTC') if timestamps.tz is None else timestamps.tz_convert('UTC')
+
+
+class _ResponseStream(io.RawIOBase):
+    """
+    Read-only file object over the chunks of a streamed response,
+    so they can be parsed as they arrive.
+    """
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            self._buffer = next(self._chunks, None)
+            if self._buffer is None:
+                self._buffer = b''
+                return 0
+
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+
+        return n
 
 
 class Requester:
     BASE_URL = 'https://environment.data.gov.uk/hydrology/id'
+    MEASURE_IDS_FILE = 'measure_ids.json'
+    COLUMNS = ['dateTime', 'value', 'quality']
+    DTYPES = {'value': 'float32', 'quality': 'category'}
+    CHUNK_ROWS = 100_000
+    CHUNK_BYTES = 1 << 20
 
     def __init__(
             self,
@@ -15,61 +72,202 @@ class Requester:
             data_path,
             start_date,
             end_date,
+            max_workers=1,
+            timeout=60,
+            max_attempts=5,
+            base_url=BASE_URL,
     ):
         self._station_names = station_names
         self._data_path = data_path
         self._start_date = start_date
         self._end_date = end_date
+        self._max_workers = max_workers
+        self._timeout = timeout
+        self._max_attempts = max_attempts
+        self._base_url = base_url
+
+        # One connection pool shared by every request, big enough for all the workers
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
 
         os.makedirs(self._data_path, exist_ok=True)
 
+        self._measure_ids_path = os.path.join(self._data_path, Requester.MEASURE_IDS_FILE)
+        self._measure_ids_lock = threading.Lock()
+        self._measure_ids = self._load_measure_ids()
+
     def do_request(self):
-        dfs = {}
-        for station_name in self._station_names:
-            processed_station_name = station_name.replace(' ', '%20')
-            measure_id_req_url = f"{Requester.BASE_URL}/stations.json?search={processed_station_name}"
-            name_json = requests.get(measure_id_req_url).json()
-            measure_id = name_json["items"][0]["notation"]
+        """
+        Fetches the readings of every station and loads them all.
+
+        :return: dictionary of station name to its DataFrame, see load
+        """
+        self.fetch()
 
-            processed_station_name = station_name.replace(' ', '')
-            request_url = \
-                (f"{Requester.BASE_URL}/measures/{measure_id}-level-i-900-m-qualified/readings.csv"
-                 f"?mineq-date={self._start_date}&maxeq-date={self._end_date}&_limit=2000000")
-            data_path = os.path.join(
-                self._data_path,
-                f'{processed_station_name}_{self._start_date}_{self._end_date}.csv')
-            if os.path.exists(data_path):
-                print(f'Data already exists between {self._start_date} and {self._end_date} for {station_name}')
+        return {station_name: self.load(station_name) for station_name in self._station_names}
 
-                df = pd.read_csv(data_path)
+    def fetch(self):
+        """
+        Downloads the readings of every station that their stores do not have yet, without loading them.
+        """
+        try:
+            with instrumentation.stage('request'):
+                if self._max_workers == 1:
+                    for station_name in self._station_names:
+                        self._fetch_station(station_name)
+                else:
+                    with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+                        list(executor.map(self._fetch_station, self._station_names))
+        finally:
+            # The measure ids looked up before a station failed are kept for the next run
+            self._save_measure_ids()
 
-                df['dateTime'] = pd.to_datetime(df['dateTime'])
-                df = df.set_index('dateTime')
+        print('Done requesting data!')
 
-                dfs[station_name] = df
-                continue
+    def load(self, station_name) -> pd.DataFrame:
+        """
+        :return: readings of a station between the start and end dates from its store, as views of the
+            memory-mapped columns, so only the parts that are used are read
+        """
+        with instrumentation.stage('load'):
+            df = StationStore(self._data_path, station_name).load(self._start_date, self._end_date)
+        instrumentation.count('rows', len(df))
 
-            print(f'Requesting data for {station_name}...')
-            res = requests.get(request_url)
+        return df
 
-            df = pd.read_csv(StringIO(res.text))
+    def _fetch_station(self, station_name):
+        store = StationStore(self._data_path, station_name)
 
-            df = df.drop(columns=['measure', 'completeness', 'qcode', 'date'])
+        missing_ranges = store.missing_ranges(self._start_date, self._end_date)
+        if not missing_ranges:
+            print(f'Data already exists between {self._start_date} and {self._end_date} for {station_name}')
 
-            df['dateTime'] = pd.to_datetime(df['dateTime'])
-            df = df.set_index('dateTime')
+        # Only request the date ranges the store does not cover yet
+        for start_date, end_date in missing_ranges:
+            measure_id = self._get_measure_id(station_name)
 
-            # TODO: Remove this
-            df = df.dropna(subset=['value'])
+            print(f'Requesting data between {start_date} and {end_date} for {station_name}...')
+            with instrumentation.stage('download'):
+                # Every parsed chunk is handed to the store as the body arrives. A body cut off halfway is
+                # requested again from the start, as the store only takes the range once it is complete
+                for attempt in self._retrying():
+                    with attempt:
+                        with self._readings(measure_id, f"mineq-date={start_date}&maxeq-date={end_date}") as chunks:
+                            store.add_chunks(chunks, start_date, end_date)
 
-            df.to_csv(
-                os.path.join(
-                    self._data_path,
-                    f'{processed_station_name}_{self._start_date}_{self._end_date}.csv'),
-                    index=True)
+    def request_since(self, station_name, since) -> pd.DataFrame:
+        """
+        Requests the readings of a station newer than since, without going through the store.
 
-            dfs[station_name] = df
+        :param since: timestamp of the last reading already seen, in UTC if it has no time zone
+        :return: DataFrame indexed by dateTime in UTC with value and quality columns, sorted by dateTime
+        """
+        since = _utc(pd.Timestamp(since))
+        measure_id = self._get_measure_id(station_name)
 
-        print('Done requesting data!')
+        for attempt in self._retrying():
+            with attempt:
+                with self._readings(measure_id, f"min-dateTime={since.strftime('%Y-%m-%dT%H:%M:%S')}") as chunks:
+                    chunks = list(chunks)
+
+        df = pd.concat(chunks).sort_index()
+        # The API gives its times in UTC, with or without an offset
+        df.index = _utc(df.index)
+
+        # min-dateTime is inclusive, and the API may round it down
+        return df[df.index > since]
+
+    @contextlib.contextmanager
+    def _readings(self, measure_id, query):
+        """
+        Requests the readings of a measure, and yields an iterator of DataFrames parsed from the
+        body chunk by chunk as it arrives, which must be consumed before leaving the context.
+        Attempts of _retrying should wrap the whole context, so a body cut off halfway is requested again.
+
+        :param query: query string filtering the readings, such as their dates
+        """
+        request_url = \
+            (f"{self._base_url}/measures/{measure_id}-level-i-900-m-qualified/readings.csv"
+             f"?{query}&_limit=2000000")
+
+        # Not retried on its own, as callers retry the whole download and parse of the body
+        res = self._get_once(request_url, stream=True)
+        with res:
+            stream = io.BufferedReader(_ResponseStream(res.iter_content(chunk_size=Requester.CHUNK_BYTES)))
+            # TODO: Remove the dropna
+            yield (chunk.dropna(subset=['value']) for chunk in self.parse_chunks(stream))
+
+    def _get_measure_id(self, station_name):
+        with self._measure_ids_lock:
+            if station_name in self._measure_ids:
+                return self._measure_ids[station_name]
+
+        processed_station_name = station_name.replace(' ', '%20')
+        measure_id_req_url = f"{self._base_url}/stations.json?search={processed_station_name}"
+        name_json = self._get(measure_id_req_url).json()
+        measure_id = name_json["items"][0]["notation"]
+
+        with self._measure_ids_lock:
+            self._measure_ids[station_name] = measure_id
+
+        return measure_id
+
+    @staticmethod
+    def parse_chunks(source):
+        """
+        Parses a readings CSV in chunks of CHUNK_ROWS rows, keeping only the
+        needed columns with compact dtypes and dateTime as index.
+        """
+        for chunk in pd.read_csv(
+                source,
+                usecols=Requester.COLUMNS,
+                dtype=Requester.DTYPES,
+                chunksize=Requester.CHUNK_ROWS):
+            chunk['dateTime'] = pd.to_datetime(chunk['dateTime'])
+
+            yield chunk.set_index('dateTime')
+
+    def _get(self, url, stream=False):
+        """
+        GET request on the shared session, retried as in _retrying.
+        """
+        for attempt in self._retrying():
+            with attempt:
+                res = self._get_once(url, stream)
+
+        return res
+
+    def _get_once(self, url, stream=False):
+        res = self._session.get(url, timeout=self._timeout, stream=stream)
+        try:
+            res.raise_for_status()
+        except requests.HTTPError:
+            res.close()
+            raise
+
+        return res
+
+    def _retrying(self) -> Retrying:
+        """
+        Attempts of a request, up to max_attempts with exponential backoff, on connection errors,
+        timeouts, bodies cut off halfway, 429 and 5xx responses.
+        """
+        return Retrying(
+            stop=stop_after_attempt(self._max_attempts),
+            wait=wait_exponential(multiplier=0.5, max=30),
+            retry=retry_if_exception(_is_retryable),
+            reraise=True)
+
+    def _load_measure_ids(self):
+        if not os.path.exists(self._measure_ids_path):
+            return {}
+
+        with open(self._measure_ids_path) as f:
+            return json.load(f)
 
-        return dfs
+    def _save_measure_ids(self):
+        with self._measure_ids_lock:
+            with open(self._measure_ids_path, 'w') as f:
+                json.dump(self._measure_ids, f, indent=2)
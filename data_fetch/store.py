@@ -0,0 +1,274 @@
+import datetime
+import json
+import os
+import shutil
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+
+class StationStore:
+    """
+    Local columnar store of the readings of a station. Timestamps, values and quality
+    codes are kept in .npy files that are memory-mapped when read, next to an index
+    of the date ranges they cover, so only missing date ranges have to be requested.
+
+    Layout of <data_path>/<station>/:
+        index.json                     covered date ranges (inclusive), quality categories and generation
+        generation-<n>/timestamps.npy  int64 nanoseconds since epoch, sorted
+        generation-<n>/values.npy      float32 values
+        generation-<n>/quality.npy     int8 codes into the quality categories, -1 if missing
+
+    Every merge writes all the columns to a new generation directory, and replacing the index
+    switches to it at once, so an interrupted merge leaves the previous generation in use.
+    """
+    INDEX_FILE = 'index.json'
+    GENERATION_PREFIX = 'generation-'
+    COLUMNS = {
+        'timestamps': np.int64,
+        'values': np.float32,
+        'quality': np.int8,
+    }
+
+    def __init__(self, data_path, station_name):
+        self._path = os.path.join(data_path, self.directory_name(station_name))
+
+        # Stores used to be named after the station without spaces, which only fits names without separators
+        legacy_path = os.path.join(data_path, station_name.replace(' ', ''))
+        if ('/' not in station_name and station_name.strip(' .') and legacy_path != self._path
+                and os.path.isdir(legacy_path) and not os.path.exists(self._path)):
+            os.rename(legacy_path, self._path)
+
+        os.makedirs(self._path, exist_ok=True)
+
+        self._ranges, self._quality_categories, self._generation = self._read_index()
+
+    @staticmethod
+    def directory_name(station_name) -> str:
+        """
+        :return: name of the directory of a station, with separators encoded so it is a single
+            directory inside the data path
+        """
+        if not station_name:
+            raise ValueError("Station name must not be empty")
+
+        name = quote(station_name, safe='')
+        # quote leaves dots alone, so . and .. would still point outside of the store
+        if name in ('.', '..'):
+            name = name.replace('.', '%2E')
+
+        return name
+
+    @property
+    def ranges(self) -> list[tuple[datetime.date, datetime.date]]:
+        return list(self._ranges)
+
+    def missing_ranges(self, start_date, end_date) -> list[tuple[datetime.date, datetime.date]]:
+        """
+        :return: inclusive date ranges between start_date and end_date that are not in the store
+        """
+        missing = []
+        current = start_date
+        for range_start, range_end in self._ranges:
+            if range_end < current:
+                continue
+            if range_start > end_date:
+                break
+
+            if range_start > current:
+                missing.append((current, range_start - datetime.timedelta(days=1)))
+            current = range_end + datetime.timedelta(days=1)
+
+            if current > end_date:
+                break
+
+        if current <= end_date:
+            missing.append((current, end_date))
+
+        return missing
+
+    def add_chunks(self, chunks, start_date, end_date):
+        """
+        Adds the readings between start_date and end_date, which must not be in
+        the store yet. Chunks are written to disk as they come and merged with
+        the stored columns into a new generation at the end, so they are never all in
+        memory at once, and the store only changes once the whole merge is on disk.
+
+        :param chunks: iterable of DataFrames indexed by dateTime with value and quality columns
+        """
+        part_paths = {column: os.path.join(self._path, f'{column}.part') for column in StationStore.COLUMNS}
+        part_files = {column: open(path, 'wb') for column, path in part_paths.items()}
+        try:
+            for chunk in chunks:
+                part_files['timestamps'].write(
+                    chunk.index.values.astype('datetime64[ns]').astype(np.int64).tobytes())
+                part_files['values'].write(chunk['value'].to_numpy(dtype=np.float32).tobytes())
+                part_files['quality'].write(self._quality_codes(chunk['quality']).tobytes())
+        finally:
+            for f in part_files.values():
+                f.close()
+
+        new_columns = {
+            column: np.fromfile(path, dtype=dtype)
+            for (column, dtype), path in zip(StationStore.COLUMNS.items(), part_paths.values())
+        }
+
+        generation = self._merge(new_columns)
+        ranges = self._merge_ranges(self._ranges + [(start_date, end_date)])
+        self._write_index(ranges, generation)
+        self._ranges, self._generation = ranges, generation
+
+        for path in part_paths.values():
+            os.remove(path)
+        self._remove_stale_generations()
+
+    def load(self, start_date=None, end_date=None) -> pd.DataFrame:
+        """
+        Loads the readings between start_date and end_date, both inclusive, or all
+        of them if not given. Values and timestamps are views of the memory-mapped files.
+        """
+        columns = self._load_columns()
+        if columns is None:
+            return pd.DataFrame(
+                {'value': pd.Series(dtype='float32'), 'quality': pd.Series(dtype='category')},
+                index=pd.DatetimeIndex([], name='dateTime'))
+
+        timestamps = columns['timestamps']
+        first, last = 0, len(timestamps)
+        if start_date is not None:
+            first = np.searchsorted(timestamps, pd.Timestamp(start_date).value, side='left')
+        if end_date is not None:
+            end = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+            last = np.searchsorted(timestamps, end.value, side='left')
+
+        index = pd.DatetimeIndex(timestamps[first:last].view('datetime64[ns]'), name='dateTime')
+        quality = pd.Categorical.from_codes(columns['quality'][first:last], categories=self._quality_categories)
+
+        return pd.DataFrame({'value': columns['values'][first:last], 'quality': quality}, index=index, copy=False)
+
+    def _merge(self, new_columns) -> int:
+        """
+        Writes the stored columns with new_columns inserted to a new generation directory.
+
+        :return: the new generation, which the store switches to once it is written to the index
+        """
+        generation = (self._generation or 0) + 1
+        # Left over by a merge interrupted before it was written to the index
+        shutil.rmtree(self._generation_path(generation), ignore_errors=True)
+        os.makedirs(self._generation_path(generation))
+
+        columns = self._load_columns()
+        if columns is None:
+            for column, values in new_columns.items():
+                self._write_column(column, generation, [values])
+            return generation
+
+        # New readings cover a date range missing from the store, so they go in a single block
+        position = 0
+        if len(new_columns['timestamps']):
+            position = np.searchsorted(columns['timestamps'], new_columns['timestamps'][0])
+
+        for column, values in new_columns.items():
+            self._write_column(column, generation, [columns[column][:position], values, columns[column][position:]])
+
+        return generation
+
+    def _write_column(self, column, generation, parts):
+        out = np.lib.format.open_memmap(
+            self._column_path(column, generation),
+            mode='w+',
+            dtype=StationStore.COLUMNS[column],
+            shape=(sum(len(part) for part in parts),))
+        position = 0
+        for part in parts:
+            out[position:position + len(part)] = part
+            position += len(part)
+        out.flush()
+        del out
+
+    def _load_columns(self):
+        if not os.path.exists(self._column_path('timestamps', self._generation)):
+            return None
+
+        return {
+            column: np.load(self._column_path(column, self._generation), mmap_mode='r')
+            for column in StationStore.COLUMNS
+        }
+
+    def _remove_stale_generations(self):
+        # Generations replaced by the current one or left over by interrupted merges
+        current = self._generation_name(self._generation)
+        for name in os.listdir(self._path):
+            generation = name[len(StationStore.GENERATION_PREFIX):]
+            if name.startswith(StationStore.GENERATION_PREFIX) and generation.isdigit() and name != current:
+                shutil.rmtree(os.path.join(self._path, name), ignore_errors=True)
+
+        # Columns of stores written before generations, which lived in the station directory
+        for column in StationStore.COLUMNS:
+            for name in (f'{column}.npy', f'{column}.npy.tmp.npy'):
+                path = os.path.join(self._path, name)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _quality_codes(self, quality):
+        quality = pd.Series(quality).astype('category')
+        for category in quality.cat.categories:
+            if category not in self._quality_categories:
+                self._quality_categories.append(category)
+
+        mapping = np.array([self._quality_categories.index(c) for c in quality.cat.categories], dtype=np.int8)
+        codes = quality.cat.codes.to_numpy()
+
+        return np.where(codes >= 0, mapping[codes] if len(mapping) else -1, -1).astype(np.int8)
+
+    def _column_path(self, column, generation):
+        return os.path.join(self._generation_path(generation), f'{column}.npy')
+
+    def _generation_path(self, generation):
+        # Stores written before generations keep their columns in the station directory
+        if generation is None:
+            return self._path
+
+        return os.path.join(self._path, self._generation_name(generation))
+
+    @staticmethod
+    def _generation_name(generation):
+        return f'{StationStore.GENERATION_PREFIX}{generation}'
+
+    def _read_index(self):
+        path = os.path.join(self._path, StationStore.INDEX_FILE)
+        if not os.path.exists(path):
+            return [], [], None
+
+        with open(path) as f:
+            index = json.load(f)
+
+        ranges = [(datetime.date.fromisoformat(start), datetime.date.fromisoformat(end))
+                  for start, end in index['ranges']]
+
+        return ranges, index['quality_categories'], index.get('generation')
+
+    def _write_index(self, ranges, generation):
+        path = os.path.join(self._path, StationStore.INDEX_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({
+                'ranges': [[start.isoformat(), end.isoformat()] for start, end in ranges],
+                'quality_categories': self._quality_categories,
+                'generation': generation,
+            }, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def _merge_ranges(ranges):
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + datetime.timedelta(days=1):
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+
+        return merged
@@ -1,2 +1,10 @@
-from .plotter import Plotter
-from .printer import Printer
\ No newline at end of file
+from utils.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'decimate': '.decimation',
+    'evaluate_results': '.results',
+    'load_results': '.results',
+    'Plotter': '.plotter',
+    'Printer': '.printer',
+    'ResultsWriter': '.results',
+})
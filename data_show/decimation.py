@@ -0,0 +1,93 @@
+import numpy as np
+
+METHODS = ('lttb', 'min_max')
+
+
+def lttb(x, y, n_out) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets (Steinarsson, 2013). Keeps the first and last points and,
+    from each of n_out - 2 buckets of consecutive points in between, the one forming the
+    largest triangle with the point kept in the previous bucket and the mean of the next one.
+
+    :param x: sorted x coordinates
+    :param y: y coordinates
+    :param n_out: number of points to keep
+    :return: sorted indices of the kept points
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Bucket i spans [edges[i], edges[i + 1]), and the last point is a bucket on its own
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    edges = np.append(edges, n)
+
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2]
+        mean_x = x[next_start:next_end].mean()
+        mean_y = y[next_start:next_end].mean()
+
+        areas = np.abs((x[a] - mean_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (mean_y - y[a]))
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+
+    return indices
+
+
+def min_max(y, n_out) -> np.ndarray:
+    """
+    Keeps the first and last points and the minimum and maximum of each of n_out / 2
+    buckets of consecutive points, so every spike stays visible whatever its width.
+
+    :param y: y coordinates
+    :param n_out: number of points to keep
+    :return: sorted indices of the kept points
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    n_buckets = n_out // 2
+    if n_out >= n or n_buckets < 1:
+        return np.arange(n)
+
+    # Equal buckets over the first n_buckets * size points, and one more with the rest
+    size = n // n_buckets
+    buckets = y[:n_buckets * size].reshape(n_buckets, size)
+    starts = np.arange(n_buckets) * size
+    indices = [starts + buckets.argmin(axis=1), starts + buckets.argmax(axis=1), [0, n - 1]]
+    if n_buckets * size < n:
+        tail = y[n_buckets * size:]
+        indices.append(n_buckets * size + np.array([tail.argmin(), tail.argmax()]))
+
+    return np.unique(np.concatenate(indices))
+
+
+def decimate(x, y, n_out, method='lttb', keep=None) -> np.ndarray:
+    """
+    Indices of about n_out points of the series (x, y) that draw like the whole of it.
+    Non-finite values are skipped.
+
+    :param method: lttb or min_max
+    :param keep: boolean mask of points to keep whatever the method, such as outliers
+    :return: sorted indices of the kept points
+    """
+    if method not in METHODS:
+        raise ValueError(f'Decimation method {method} not available. Available methods: {METHODS}')
+
+    y = np.asarray(y, dtype=np.float64)
+    finite = np.flatnonzero(np.isfinite(y))
+    if method == 'lttb':
+        indices = finite[lttb(np.asarray(x, dtype=np.float64)[finite], y[finite], n_out)]
+    else:
+        indices = finite[min_max(y[finite], n_out)]
+
+    if keep is not None:
+        indices = np.union1d(indices, np.flatnonzero(keep))
+
+    return indices
@@ -1,30 +1,121 @@
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-import seaborn as sns
+import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from .decimation import decimate
 
 
 class Plotter:
-    def __init__(self, df, plot_path):
+    """
+    Plots of a series of readings. Series longer than max_points are decimated before
+    drawing, always keeping the outliers, so multi-million-point series draw as fast as
+    short ones.
+
+    Saved plots are drawn on Agg figures outside of pyplot, so they need no display and
+    are released once saved instead of piling up in pyplot. They are saved by a pool of
+    save_workers threads, letting the caller go on while they are written, up to two
+    pending saves per thread. close waits for every pending save.
+    """
+    def __init__(self, df, plot_path, max_points=10_000, decimation='lttb', save_workers=1):
+        """
+        :param max_points: number of points to decimate series to, None to draw every point
+        :param decimation: lttb or min_max, see data_show.decimation
+        :param save_workers: threads saving plots, 0 to save them before returning
+        """
         self._plot_path = plot_path
         self._df = df
+        self._max_points = max_points
+        self._decimation = decimation
+
+        self._executor = ThreadPoolExecutor(max_workers=save_workers) if save_workers else None
+        self._max_pending = 2 * save_workers
+        self._pending = deque()
 
         os.makedirs(self._plot_path, exist_ok=True)
 
-    def plot_predictions(self, title, target, predictions):
-        plt.figure(figsize=(20, 10))
-        sns.lineplot(data=self._df, x=self._df.index, y=target)
-        sns.scatterplot(data=predictions, x=predictions.index, y=target, color='red', markers='o', label='Outliers')
-        plt.title(title)
-        plt.show()
+    def plot_predictions(self, title, target, predictions, show=True):
+        """
+        Plots the target column of the series with its outliers.
+
+        :param predictions: rows of the series that are outliers
+        :param show: True to show the plot in a window, False to save it to <title>.png instead
+        """
+        fig = plt.figure(figsize=(20, 10)) if show else Figure(figsize=(20, 10))
+        ax = fig.gca() if show else fig.add_subplot()
+
+        index = self._df.index
+        values = self._df[target].to_numpy()
+        keep = index.isin(predictions.index)
+        indices = self._decimate(index, values, keep)
+
+        ax.plot(index[indices], values[indices], linewidth=1)
+        ax.scatter(predictions.index, predictions[target], color='red', marker='o', label='Outliers', zorder=2)
+        ax.set_xlabel(index.name)
+        ax.set_ylabel(target)
+        ax.set_title(title)
+        ax.legend()
+
+        if show:
+            plt.show()
+        else:
+            self._save(fig, title)
 
     def plot_roc_auc(self, fpr, tpr, auc, title):
-        plt.figure(figsize=(20, 10))
-        sns.lineplot(x=fpr, y=tpr, label=f'ROC curve (area = {auc:.2f})')
-        plt.xlim([0.0, 1.0])
-        plt.ylim([0.0, 1.05])
-        plt.xlabel('False Positive Rate')
-        plt.ylabel('True Positive Rate')
-        plt.title(title)
-        plt.legend(loc="lower right")
-        plt.savefig(os.path.join(self._plot_path, f"{title}.png"))
+        fig = Figure(figsize=(20, 10))
+        ax = fig.add_subplot()
+
+        indices = self._decimate(fpr, tpr)
+        ax.plot(fpr[indices], tpr[indices], label=f'ROC curve (area = {auc:.2f})')
+        ax.set_xlim([0.0, 1.0])
+        ax.set_ylim([0.0, 1.05])
+        ax.set_xlabel('False Positive Rate')
+        ax.set_ylabel('True Positive Rate')
+        ax.set_title(title)
+        ax.legend(loc="lower right")
+
+        self._save(fig, title)
+
+    def close(self):
+        """
+        Waits for every pending save, raising the first error of any of them.
+        """
+        while self._pending:
+            self._pending.popleft().result()
+
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _decimate(self, x, y, keep=None):
+        if self._max_points is None or len(y) <= self._max_points:
+            return np.arange(len(y))
+
+        if isinstance(x, pd.DatetimeIndex):
+            x = x.asi8
+
+        return decimate(x, y, self._max_points, self._decimation, keep)
+
+    def _save(self, fig, title):
+        FigureCanvasAgg(fig)
+        path = os.path.join(self._plot_path, f"{title}.png")
+
+        if self._executor is None:
+            fig.savefig(path)
+            return
+
+        # Figures wait in memory until saved, so drawing waits for the oldest save when too many are pending
+        while self._pending and (self._pending[0].done() or len(self._pending) >= self._max_pending):
+            self._pending.popleft().result()
+
+        self._pending.append(self._executor.submit(fig.savefig, path))
@@ -10,21 +10,41 @@ class Printer:
     def print_values_with_scores(self, df, condition_target, title):
         target_data = df[condition_target]
 
-        target_data.to_csv(os.path.join(self._scores_path, f'{title}.csv'))
+        target_data.to_parquet(os.path.join(self._scores_path, f'{title}.parquet'))
 
-    def print_scores(self, models, results, window_size):
+    def print_scores(self, models, results, window_size=None):
         # Create a table with the accuracy of each model
+        params_names = {model.name: list(model.params.keys()) for model in models}
         for model, res in results.items():
-            current_model = filter(lambda x: x.name == model, models)
-            model_params = next(current_model).params
-
-            params_names = list(model_params.keys())
-
-            # Map the results to a list of lists, where each list is a row in the table
-            data = list(map(lambda x: [*x[1:-1], x[-1]], res))
-
-            with open(os.path.join(self._scores_path, f'{model}_with_window_size_{window_size}.txt'), 'w') as f:
+            # Rows are [name, *params, precision, recall, F1 score], and the table leaves out the name
+            title = model if window_size is None else f'{model}_with_window_size_{window_size}'
+            with open(os.path.join(self._scores_path, f'{title}.txt'), 'w') as f:
                 f.write(tabulate.tabulate(
-                    data,
-                    headers=[*params_names, 'Precision', 'Recall', 'F1 score'],
+                    [row[1:] for row in res],
+                    headers=[*params_names[model], 'Precision', 'Recall', 'F1 score'],
                     tablefmt='orgtbl'))
+
+    def print_evaluation(self, evaluation, title):
+        """
+        :param evaluation: dataframe with a row per configuration, as returned by evaluate_results
+        """
+        with open(os.path.join(self._scores_path, f'{title}.txt'), 'w') as f:
+            f.write(tabulate.tabulate(
+                evaluation[['station', 'window_size', 'model', 'params', 'precision', 'recall', 'f1', 'roc_auc']],
+                headers=['Station', 'Window size', 'Model', 'Parameters', 'Precision', 'Recall', 'F1 score',
+                         'ROC AUC'],
+                tablefmt='orgtbl',
+                showindex=False))
+
+    def print_sweep(self, results, title):
+        data = [
+            [r.window_size, r.alpha, r.n_estimators, r.outlier_threshold, r.roc_auc, r.precision, r.recall, r.f1]
+            for r in results
+        ]
+
+        with open(os.path.join(self._scores_path, f'{title}.txt'), 'w') as f:
+            f.write(tabulate.tabulate(
+                data,
+                headers=['Window size', 'Alpha', 'Trees', 'Outlier threshold', 'ROC AUC', 'Precision', 'Recall',
+                         'F1 score'],
+                tablefmt='orgtbl'))
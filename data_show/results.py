@@ -0,0 +1,212 @@
+import glob
+import hashlib
+import json
+import os
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from utils.streaming_stats import StreamingROC
+
+DATASET_DIR = 'dataset'
+FORMATS = {'parquet': 'parquet', 'feather': 'feather'}
+
+# Columns identifying a configuration, the first two of which are the partitions of the dataset
+KEY_COLUMNS = ['station', 'window_size', 'model', 'params']
+PARTITIONING = ds.partitioning(pa.schema([('station', pa.string()), ('window_size', pa.int64())]), flavor='hive')
+
+_SCHEMA = pa.schema([
+    ('model', pa.dictionary(pa.int32(), pa.string())),
+    ('params', pa.dictionary(pa.int32(), pa.string())),
+    ('index', pa.int64()),
+    ('score', pa.float64()),
+    ('label', pa.bool_()),
+    ('outlier', pa.bool_()),
+])
+
+
+class ResultsWriter:
+    """
+    Writes the scores, labels and ground truth of every (station, window size, model, params)
+    configuration to one columnar dataset, partitioned by station and window size:
+        <results_path>/dataset/station=<station>/window_size=<window_size>/<model>-<params hash>.<format>
+    with a row per element of the series and the columns model, params (as JSON), index, score,
+    label and outlier. Writing a configuration again replaces its file.
+    """
+    def __init__(self, results_path, file_format='parquet'):
+        if file_format not in FORMATS:
+            raise ValueError(f"Unknown format {file_format}, expected one of {', '.join(FORMATS)}")
+
+        self.path = os.path.join(results_path, DATASET_DIR)
+        self.file_format = file_format
+
+    def write(self, station, window_size, model, params, chunks) -> str:
+        """
+        :param params: JSON-serializable dictionary of the parameters of the model
+        :param chunks: iterable of (scores, labels, ground truth) arrays of consecutive elements of the
+            series, each written as a record batch as it comes so the series is never held in memory at once
+        :return: path of the written file
+        """
+        params = json.dumps(params, sort_keys=True)
+        params_hash = hashlib.sha256(params.encode()).hexdigest()[:16]
+
+        # Slashes are encoded too, so every station is a single directory that the partitioning decodes back
+        station_dir = f"station={quote(station, safe='')}"
+        partition_path = os.path.join(self.path, station_dir, f'window_size={window_size}')
+        os.makedirs(partition_path, exist_ok=True)
+        path = os.path.join(partition_path, f'{model}-{params_hash}.{self.file_format}')
+
+        # Written next to the final file and moved over it, so readers never see a partial configuration
+        tmp_path = f'{path}.tmp'
+        if self.file_format == 'parquet':
+            writer = pq.ParquetWriter(tmp_path, _SCHEMA)
+        else:
+            writer = pa.ipc.new_file(tmp_path, _SCHEMA)
+
+        with writer:
+            offset = 0
+            for scores, labels, y_true in chunks:
+                writer.write_batch(self._batch(model, params, offset, scores, labels, y_true))
+                offset += len(scores)
+
+        os.replace(tmp_path, path)
+
+        return path
+
+    @staticmethod
+    def _batch(model, params, offset, scores, labels, y_true) -> pa.RecordBatch:
+        length = len(scores)
+        # Model and params are dictionary-encoded, a single value referenced by every row
+        codes = pa.array(np.zeros(length, dtype=np.int32))
+
+        return pa.record_batch([
+            pa.DictionaryArray.from_arrays(codes, pa.array([model])),
+            pa.DictionaryArray.from_arrays(codes, pa.array([params])),
+            pa.array(np.arange(offset, offset + length, dtype=np.int64)),
+            pa.array(np.asarray(scores, dtype=np.float64)),
+            pa.array(np.asarray(labels, dtype=bool)),
+            pa.array(np.asarray(y_true, dtype=bool)),
+        ], schema=_SCHEMA)
+
+
+def load_results(results_path, columns=None, stations=None, window_sizes=None, file_format='parquet') -> pd.DataFrame:
+    """
+    Reads the dataset written by ResultsWriter. Only the files of the requested stations and
+    window sizes are opened, and only the requested columns are read from them.
+
+    :param columns: columns to read, of KEY_COLUMNS, index, score, label and outlier. All of them by default
+    :param stations: stations to read. All of them by default
+    :param window_sizes: window sizes to read. All of them by default
+    """
+    dataset = _dataset(results_path, file_format)
+    if dataset is None:
+        return pd.DataFrame(columns=columns or KEY_COLUMNS)
+
+    return dataset.to_table(columns=columns, filter=_filter(stations, window_sizes)).to_pandas()
+
+
+def evaluate_results(results_path, stations=None, window_sizes=None, file_format='parquet') -> pd.DataFrame:
+    """
+    Precision, recall, F1 score and ROC AUC of every configuration of the dataset written by
+    ResultsWriter. The dataset is read record batch by record batch, with only the columns the
+    metrics need, and the counts of all the configurations of a batch are updated at once,
+    so memory does not grow with the length of the series. ROC AUCs come from histograms of
+    the scores, as in StreamingROC.
+
+    :return: dataframe with a row per configuration, with KEY_COLUMNS and the precision,
+        recall, f1 and roc_auc columns
+    """
+    dataset = _dataset(results_path, file_format)
+
+    configurations = {}
+    true_positives, false_positives, false_negatives = (np.zeros(0, dtype=np.int64) for _ in range(3))
+    roc = StreamingROC(n_groups=0)
+    batches = [] if dataset is None else dataset.to_batches(
+        columns=[*KEY_COLUMNS, 'score', 'label', 'outlier'], filter=_filter(stations, window_sizes))
+
+    for batch in batches:
+        if not batch.num_rows:
+            continue
+
+        keys, local_groups = _batch_groups(batch)
+        groups = np.array([configurations.setdefault(key, len(configurations)) for key in keys])[local_groups]
+
+        labels = batch.column('label').to_numpy(zero_copy_only=False)
+        y_true = batch.column('outlier').to_numpy(zero_copy_only=False)
+        n_groups = len(configurations)
+        true_positives = _add_counts(true_positives, groups, labels & y_true, n_groups)
+        false_positives = _add_counts(false_positives, groups, labels & ~y_true, n_groups)
+        false_negatives = _add_counts(false_negatives, groups, ~labels & y_true, n_groups)
+        roc.update(batch.column('score').to_numpy(), y_true, groups)
+
+    # Zero where undefined, as precision_recall_fscore_support with zero_division=0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.nan_to_num(true_positives / (true_positives + false_positives))
+        recall = np.nan_to_num(true_positives / (true_positives + false_negatives))
+        f1 = np.nan_to_num(2 * true_positives / (2 * true_positives + false_positives + false_negatives))
+
+    evaluation = pd.DataFrame(list(configurations), columns=KEY_COLUMNS)
+    evaluation['precision'] = precision
+    evaluation['recall'] = recall
+    evaluation['f1'] = f1
+    evaluation['roc_auc'] = roc.aucs()[:len(configurations)]
+
+    return evaluation.sort_values(KEY_COLUMNS, ignore_index=True)
+
+
+def _batch_groups(batch) -> tuple[list[tuple], np.ndarray]:
+    """
+    :return: configurations of a record batch, as tuples of KEY_COLUMNS values, and the index of the
+        configuration of every row, from the dictionary codes of the key columns instead of their values
+    """
+    codes = np.zeros(batch.num_rows, dtype=np.int64)
+    dictionaries = []
+    for name in KEY_COLUMNS:
+        column = batch.column(name)
+        if not pa.types.is_dictionary(column.type):
+            column = column.dictionary_encode()
+
+        dictionaries.append(column.dictionary.to_pylist())
+        codes = codes * len(dictionaries[-1]) + column.indices.to_numpy(zero_copy_only=False)
+
+    unique_codes, groups = np.unique(codes, return_inverse=True)
+
+    keys = []
+    for code in unique_codes.tolist():
+        key = []
+        for dictionary in reversed(dictionaries):
+            code, index = divmod(code, len(dictionary))
+            key.append(dictionary[index])
+        keys.append(tuple(reversed(key)))
+
+    return keys, groups
+
+
+def _dataset(results_path, file_format) -> ds.Dataset | None:
+    root = os.path.join(results_path, DATASET_DIR)
+    files = sorted(glob.glob(os.path.join(root, '*', '*', f'*.{file_format}')))
+    if not files:
+        return None
+
+    return ds.dataset(files, format=FORMATS[file_format], partitioning=PARTITIONING, partition_base_dir=root)
+
+
+def _filter(stations, window_sizes):
+    expression = None
+    if stations is not None:
+        expression = ds.field('station').isin(list(stations))
+    if window_sizes is not None:
+        window_filter = ds.field('window_size').isin(list(window_sizes))
+        expression = window_filter if expression is None else expression & window_filter
+
+    return expression
+
+
+def _add_counts(counts, groups, mask, n_groups) -> np.ndarray:
+    counts = np.pad(counts, (0, n_groups - len(counts)))
+
+    return counts + np.bincount(groups[mask], minlength=n_groups)
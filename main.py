@@ -1,72 +1,273 @@
 import argparse
 import os
+import sys
 
-import numpy as np
-import pandas as pd
+from active_outlier_detection.detection_pipeline.names import DETECTORS, SCORERS
+from utils import dates, instrumentation
+from utils.arguments import positive_int
+from utils.instrumentation import Stats
 
-from sklearn.metrics import roc_curve, auc
+# pandas, scikit-learn, scipy and matplotlib are only imported by the subcommands that need
+# them, after the arguments are parsed, so --help and argument errors return right away
+COMMANDS = ('fetch', 'detect', 'train', 'plot')
 
-from active_outlier_detection.detection_pipeline import KSBLWINIForest
-from data_fetch import Requester
-from data_show import Plotter
-from utils import dates
 
+def main(argv=None):
+    args = parse_args(argv)
+    args.func(args)
 
-def main():
-    args = parse_args()
+
+def fetch(args):
+    from data_fetch import Requester
+
+    start_date, end_date = dates.parse_dates(args.start_date, args.end_date)
+
+    requester = Requester(args.stations, args.data_path, start_date.date(), end_date.date(), max_workers=args.workers)
+    requester.fetch()
+
+
+def detect(args):
     (stations, start_date, end_date, data_path,
-     results_path, plot_data, config_path, models_path, window_sizes, n_trees) = (
+     results_path, plot_data, config_path, models_path, window_sizes, n_trees, workers,
+     alphas, outlier_thresholds, sweep, checkpoint_every, instrument, detector,
+     scorer, max_batch_size, chunk_size, results_format) = (
         args.stations, args.start_date, args.end_date, args.data_path,
-        args.results_path, args.plot_data, args.config_path, args.models_path, args.window_sizes, args.n_trees)
+        args.results_path, args.plot_data, args.config_path, args.models_path, args.window_sizes, args.n_trees,
+        args.workers, args.alphas, args.outlier_thresholds, args.sweep, args.checkpoint_every,
+        args.instrument, args.detector, args.scorer, args.max_batch_size, args.chunk_size,
+        args.results_format)
 
     start_date, end_date = dates.parse_dates(start_date, end_date)
 
-    requester = Requester(stations, data_path, start_date.date(), end_date.date())
+    from sklearn.metrics import roc_curve, auc
+
+    from active_outlier_detection.detection_pipeline import ScoringQueue
+    from data_fetch import Requester
+    from data_show import Plotter, Printer, ResultsWriter, evaluate_results
+    from models import ModelCache
+    from runner import Scheduler
+    from utils.streaming_stats import StreamingROC
+
+    requester = Requester(stations, data_path, start_date.date(), end_date.date(), max_workers=workers)
+
+    # Stats of the whole run, while each station gets its own from the scheduler
+    run_stats = Stats() if instrument else None
+    with instrumentation.collect(run_stats):
+        requester.fetch()
+
+    if sweep:
+        run_sweep(requester, stations, results_path, window_sizes, alphas, n_trees, outlier_thresholds)
+        return
 
-    dfs = requester.do_request()
+    model_cache = ModelCache(models_path) if models_path else None
 
-    for station, df in dfs.items():
+    # Parameters of the pipelines that change their outputs, stored with them in the results dataset
+    pipeline_params = {
+        'n_estimators': n_trees[0],
+        'alpha': alphas[0],
+        'outlier_threshold': outlier_thresholds[0],
+        'detector': detector,
+        'scorer': scorer,
+    }
+    scheduler = Scheduler(workers, {
+        **pipeline_params,
+        'model_cache': model_cache,
+        # Batch runs have no one waiting for the scores of a window, so the queue only flushes when full
+        'scoring_queue': ScoringQueue(max_batch_size, max_latency=None) if max_batch_size else None,
+    }, checkpoint_every, instrument, chunk_size)
+
+    # Stations are loaded from their stores and processed one at a time, with the window sizes of a station
+    # run in parallel, so only the readings and outputs of one station are in memory at once
+    writer = ResultsWriter(results_path, results_format)
+    for station in stations:
+        with instrumentation.collect(run_stats):
+            df = requester.load(station)
+
+        # Outputs of every window size of a station go to one on-disk sink next to its plots
         station_path = os.path.join(results_path, station.replace(' ', ''))
+        sink_path = os.path.join(station_path, 'outputs')
+        with instrumentation.collect(run_stats), instrumentation.stage('scheduler'):
+            sink = scheduler.run({station: df['value'].to_numpy()}, window_sizes, {station: sink_path})[station]
+
         os.makedirs(station_path, exist_ok=True)
 
         plots_path = os.path.join(station_path, 'plots')
 
-        z_score = (df['value'] - df['value'].mean()) / df['value'].std()
-        df['outlier'] = z_score.abs() >= 3
+        # Plots are saved in the background while the rest of the station is processed, and waited for before
+        # the next one, as they hold its readings
+        with instrumentation.collect(scheduler.stats.get(station)), Plotter(df, plots_path) as plotter:
+            # In chunks, the ground truth is computed chunk by chunk from running moments of the readings instead
+            value_stats = None
+            with instrumentation.stage('ground_truth'):
+                if not chunk_size or config_path:
+                    df['outlier'] = ground_truth(df)
+                if chunk_size:
+                    value_stats = running_stats(df['value'].to_numpy(), chunk_size)
+
+            if config_path:
+                with instrumentation.stage('grid_search'):
+                    run_grid_search(df, config_path, station_path, workers, model_cache)
+
+            for window_size in window_sizes:
+                scores, labels = sink.scores(window_size), sink.labels(window_size)
+
+                with instrumentation.stage('results'):
+                    writer.write(station, window_size, 'KSBLWINIForest', pipeline_params,
+                                 output_chunks(df, scores, labels, chunk_size, value_stats))
+
+                with instrumentation.stage('roc'):
+                    if chunk_size:
+                        roc = StreamingROC()
+                        for chunk_scores, _, y_true in output_chunks(df, scores, labels, chunk_size, value_stats):
+                            roc.update(chunk_scores, y_true)
+                        fpr, tpr, _ = roc.curve()
+                        roc_auc = roc.auc()
+                    else:
+                        fpr, tpr, thresholds = roc_curve(df['outlier'][:len(scores)], scores)
+                        roc_auc = auc(fpr, tpr)
+
+                with instrumentation.stage('plot'):
+                    plotter.plot_roc_auc(fpr, tpr, roc_auc, f"{station} ROC AUC for window size {window_size}")
+
+        if instrument:
+            scheduler.stats[station].save(os.path.join(station_path, 'instrumentation.json'))
+
+        del df, sink
+
+    with instrumentation.collect(run_stats), instrumentation.stage('evaluation'):
+        evaluation = evaluate_results(results_path, stations, window_sizes, results_format)
+        Printer(results_path).print_evaluation(evaluation, 'evaluation')
+
+    if instrument:
+        run_stats.save(os.path.join(results_path, 'instrumentation.json'))
+
+    if model_cache is not None:
+        # Only counts the lookups of this process, not the ones of pool workers
+        stats = model_cache.stats
+        print(f"Model cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions")
+
+
+def train(args):
+    start_date, end_date = dates.parse_dates(args.start_date, args.end_date)
+
+    from data_fetch import Requester
+    from models import ModelCache
+
+    requester = Requester(args.stations, args.data_path, start_date.date(), end_date.date(), max_workers=args.workers)
+    requester.fetch()
+
+    model_cache = ModelCache(args.models_path) if args.models_path else None
+    for station in args.stations:
+        df = requester.load(station)
+        df['outlier'] = ground_truth(df)
+        run_grid_search(df, args.config_path, os.path.join(args.results_path, station.replace(' ', '')),
+                        args.workers, model_cache)
+
+
+def plot(args):
+    start_date, end_date = dates.parse_dates(args.start_date, args.end_date)
+
+    import numpy as np
+
+    from active_outlier_detection.detection_pipeline import ResultSink
+    from data_fetch import StationStore
+    from data_show import Plotter
+
+    for station in args.stations:
+        df = StationStore(args.data_path, station).load(start_date, end_date)
+        if df.empty:
+            print(f'No stored readings of {station} between {args.start_date} and {args.end_date}')
+            continue
+
+        station_path = os.path.join(args.results_path, station.replace(' ', ''))
+        title = f"{station} outliers"
+        if args.window_size is None:
+            outliers = ground_truth(df).to_numpy()
+        else:
+            # Labels of the last detect run, whose readings are the ones of the same dates
+            sink_path = os.path.join(station_path, 'outputs')
+            sink = ResultSink.open(sink_path) if os.path.exists(sink_path) else None
+            if sink is None or sink.length != len(df) or args.window_size not in sink.window_sizes:
+                print(f'No detect run of {station} between {args.start_date} and {args.end_date} '
+                      f'with window size {args.window_size}')
+                continue
+
+            outliers = np.zeros(len(df), dtype=bool)
+            written = sink.written(args.window_size)
+            outliers[:written] = sink.labels(args.window_size)[:written]
+            title += f" for window size {args.window_size}"
+
+        with Plotter(df, os.path.join(station_path, 'plots'), args.max_points, args.decimation) as plotter:
+            plotter.plot_predictions(title, 'value', df[outliers], show=args.show)
+
 
-        plotter = Plotter(df, plots_path)
+def ground_truth(df):
+    # Readings with an absolute z-score of at least 3 are taken as the actual outliers
+    z_score = (df['value'] - df['value'].mean()) / df['value'].std()
 
-        df = df.drop(columns=['quality'])
+    return z_score.abs() >= 3
 
-        res = pd.DataFrame()
-        for window_size in window_sizes:
-            ksblwin_iforest = KSBLWINIForest(window_size=window_size)
 
-            score_list = np.array([])
-            labels_list = np.array([])
-            for dt, element in df.iterrows():
-                scores, labels = ksblwin_iforest.run_pipe(element['value'])
+def running_stats(values, chunk_size):
+    from utils.streaming_stats import RunningStats
 
-                if scores is not None:
-                    labels_list = np.concatenate([labels_list, labels])
-                    score_list = np.concatenate([score_list, scores])
+    stats = RunningStats()
+    for start in range(0, len(values), chunk_size):
+        stats.update(values[start:start + chunk_size])
 
-            scores_series = pd.Series(score_list, index=df.index[:len(score_list)], name="scores")
-            labels_series = pd.Series(labels_list, index=df.index[:len(labels_list)], name="labels")
-            res[f"score_w{window_size}"] = scores_series
-            res[f"label_w{window_size}"] = labels_series
+    return stats
 
-            fpr, tpr, thresholds = \
-                roc_curve(df[:len(score_list)]['outlier'], res[:len(score_list)][f"score_w{window_size}"])
-            roc_auc = auc(fpr, tpr)
-            plotter.plot_roc_auc(fpr, tpr, roc_auc, f"{station} ROC AUC for window size {window_size}")
 
+def output_chunks(df, scores, labels, chunk_size=None, stats=None):
+    """
+    Yields the scores and labels of a pipeline with the ground truth of the same readings, chunk_size
+    at a time, with the ground truth computed from stats, the running moments of the readings. Without
+    chunk_size, in a single chunk with the outlier column of df.
+    """
+    if not chunk_size:
+        yield scores, labels, df['outlier'].to_numpy()[:len(scores)]
+        return
 
+    values = df['value'].to_numpy()
+    for start in range(0, len(scores), chunk_size):
+        end = min(start + chunk_size, len(scores))
+        yield scores[start:end], labels[start:end], abs((values[start:end] - stats.mean) / stats.std) >= 3
 
 
-def parse_args():
-    parser = argparse.ArgumentParser()
+def run_grid_search(df, config_path, station_path, workers, model_cache):
+    from config import ConfigReader
+    from data_show import Printer
+    from models import GridSearch
 
+    models = ConfigReader(config_path).read()
+    printer = Printer(station_path)
+
+    # Tables are rewritten every time a candidate finishes, and finished candidates are stored next
+    # to them, so repeated runs only fit new ones
+    grid_search = GridSearch(df[['value']], workers, model_cache,
+                             os.path.join(station_path, 'scores', 'grid_search.json'))
+    grid_search.run(models, df['outlier'], on_result=lambda results: printer.print_scores(models, results))
+
+
+def run_sweep(requester, stations, results_path, window_sizes, alphas, n_trees, outlier_thresholds):
+    from active_outlier_detection.detection_pipeline import KSBLWINIForestSweep
+    from data_show import Printer
+
+    sweep = KSBLWINIForestSweep(window_sizes, alphas, n_trees, outlier_thresholds)
+
+    printer = Printer(results_path)
+    for station in stations:
+        df = requester.load(station)
+        outliers = ground_truth(df).to_numpy()
+
+        results = sweep.run(df['value'].to_numpy(), outliers)
+
+        printer.print_sweep(results, f"{station.replace(' ', '')}_sweep")
+
+        del df
+
+
+def add_station_args(parser):
     parser.add_argument("start_date", type=str, help="Start date")
     parser.add_argument("end_date", type=str, help="End date")
     parser.add_argument("-s", "--stations", nargs="+", type=str, help="Station names", required=True)
@@ -75,10 +276,85 @@ def parse_args():
                         type=str,
                         help="Path to data folder. Current working directory by default",
                         default=os.getcwd())
+
+
+def add_results_arg(parser):
     parser.add_argument("-r",
                         "--results_path",
                         help="Path to store results, both plots and tables. Current working directory by default",
                         default=os.getcwd())
+
+
+def add_workers_arg(parser, help):
+    parser.add_argument("-j",
+                        "--workers",
+                        type=positive_int,
+                        help=help,
+                        default=1)
+
+
+def parse_args(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # Without a subcommand, the arguments are the ones of detect, as before there were subcommands,
+    # whether they start with the dates or with an option
+    if argv and argv[0] not in (*COMMANDS, '-h', '--help'):
+        argv = ['detect', *argv]
+
+    parser = argparse.ArgumentParser(description="Detect outliers in the river levels of UK Hydrology stations.")
+    subparsers = parser.add_subparsers(title="commands", required=True)
+
+    fetch_parser = subparsers.add_parser("fetch", help="Request the readings of stations and store them")
+    fetch_parser.set_defaults(func=fetch)
+    add_station_args(fetch_parser)
+    add_workers_arg(fetch_parser, "Number of stations to request concurrently. Default is 1")
+
+    detect_parser = subparsers.add_parser("detect", help="Run the detection pipeline over the readings of stations")
+    detect_parser.set_defaults(func=detect)
+    add_detect_args(detect_parser)
+
+    train_parser = subparsers.add_parser(
+        "train", help="Fit every model of a config file on the readings of stations and store a table of scores")
+    train_parser.set_defaults(func=train)
+    add_station_args(train_parser)
+    add_results_arg(train_parser)
+    train_parser.add_argument("-c", "--config_path", type=str, help="Path to config file", required=True)
+    train_parser.add_argument("-m",
+                              "--models_path",
+                              type=str,
+                              help="Path to models folder, where models will be saved and loaded from. "
+                                   "If not specified, models won't be saved.")
+    add_workers_arg(train_parser, "Number of concurrent station requests and of processes to fit models in. "
+                                  "Default is 1")
+
+    plot_parser = subparsers.add_parser("plot", help="Plot the stored readings of stations with their outliers")
+    plot_parser.set_defaults(func=plot)
+    add_station_args(plot_parser)
+    add_results_arg(plot_parser)
+    plot_parser.add_argument("-w",
+                             "--window_size",
+                             type=int,
+                             help="Window size of a previous detect run whose outliers to plot. "
+                                  "Default is plotting the readings with an absolute z-score of at least 3",
+                             default=None)
+    plot_parser.add_argument("--max_points",
+                             type=int,
+                             help="Number of points to decimate the series to. Default is 10000",
+                             default=10_000)
+    plot_parser.add_argument("--decimation",
+                             type=str,
+                             choices=("lttb", "min_max"),
+                             help="Decimation method. Default is lttb",
+                             default="lttb")
+    plot_parser.add_argument("--show",
+                             help="Set this to show the plots in a window instead of saving them",
+                             action="store_true")
+
+    return parser.parse_args(argv)
+
+
+def add_detect_args(parser):
+    add_station_args(parser)
+    add_results_arg(parser)
     parser.add_argument("-p",
                         "--plot_data",
                         help="Set this to true if you want to plot the data in your browser with interactive plots",
@@ -103,10 +379,77 @@ def parse_args():
                         "--n_trees",
                         type=int,
                         nargs="*",
-                        help="Number of trees in the isolation forest. Default is 100",
+                        help="Number of trees in the isolation forest. Default is 100. "
+                             "Only the first one is used unless --sweep is set",
                         default=[100])
-
-    return parser.parse_args()
+    parser.add_argument("-a",
+                        "--alphas",
+                        type=float,
+                        nargs="*",
+                        help="Significance levels of the KS test. Default is 0.01. "
+                             "Only the first one is used unless --sweep is set",
+                        default=[0.01])
+    parser.add_argument("-o",
+                        "--outlier_thresholds",
+                        type=float,
+                        nargs="*",
+                        help="Scores from which an element is an outlier. Default is 0.75. "
+                             "Only the first one is used unless --sweep is set",
+                        default=[0.75])
+    parser.add_argument("--sweep",
+                        help="Set this to evaluate every combination of window sizes, alphas, numbers of trees and "
+                             "outlier thresholds instead of running the pipeline, and store a table of the results",
+                        action="store_true")
+    parser.add_argument("-j",
+                        "--workers",
+                        type=positive_int,
+                        help="Number of concurrent station requests and of processes to run the window sizes "
+                             "of each station in, one station at a time. Default is 1",
+                        default=1)
+    parser.add_argument("--checkpoint_every",
+                        type=int,
+                        help="Number of elements between checkpoints of each (station, window size) job. "
+                             "Interrupted runs resume from their last checkpoint, and are the same as uninterrupted "
+                             "ones, so checkpointed jobs do not use the model cache. Default is no checkpoints",
+                        default=None)
+    parser.add_argument("--results_format",
+                        type=str,
+                        choices=("parquet", "feather"),
+                        help="Format of the dataset with the outputs of every (station, window size, model, "
+                             "parameters) configuration, written to the dataset directory of the results path. "
+                             "Default is parquet",
+                        default="parquet")
+    parser.add_argument("--chunk_size",
+                        type=int,
+                        help="Number of readings fed to the pipelines, written to disk and evaluated at a time, "
+                             "so memory stays flat on series longer than it. The ROC curves are then computed "
+                             "from histograms of the scores. Default is whole series",
+                        default=None)
+    parser.add_argument("--detector",
+                        type=str,
+                        choices=DETECTORS,
+                        help="Drift detector of the pipelines. ksblwin tests once per window, while adwin, "
+                             "page_hinkley and sliding_ks update on every element and retrain as soon as "
+                             "they detect drift. Default is ksblwin",
+                        default="ksblwin")
+    parser.add_argument("--scorer",
+                        type=str,
+                        choices=SCORERS,
+                        help="Outlier scorer of the pipelines. iforest scores each window once it is full, "
+                             "while hst (Half-Space Trees) scores every reading as soon as it arrives. "
+                             "Default is iforest",
+                        default="iforest")
+    parser.add_argument("--max_batch_size",
+                        type=int,
+                        help="Score the windows of each job between refits in batches of up to this many "
+                             "elements, one call per batch instead of one per window. Default is scoring "
+                             "every window right away",
+                        default=None)
+    parser.add_argument("--instrument",
+                        help="Set this to time every stage of the run and count drifts, refits and samples. "
+                             "A summary is written to instrumentation.json in the results directory of each "
+                             "station, and one of the whole run in the results directory",
+                        action="store_true")
 
 
 if __name__ == "__main__":
@@ -1,2 +1,8 @@
-from .trainer import Trainer
-from .serializer import Serializer
+from utils.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'Trainer': '.trainer',
+    'Serializer': '.serializer',
+    'ModelCache': '.model_cache',
+    'GridSearch': '.grid_search',
+})
@@ -5,6 +5,8 @@ import pandas as pd
 from sklearn.ensemble import IsolationForest
 from sklearn.neighbors import LocalOutlierFactor
 
+from data_fetch import StationStore
+
 DATA_PATH = os.path.join(os.path.pardir, "data")
 
 TEST_SIZE = 0.3
@@ -25,11 +27,9 @@ def fit_predict_lof(df):
 def main():
     station = "SunburyLock"
 
-    df = pd.read_csv(os.path.join(DATA_PATH, f"{station}.csv"))
+    df = StationStore(DATA_PATH, station).load()
 
-    df["dateTime"] = pd.to_datetime(df["dateTime"])
-    df.set_index("dateTime", inplace=True)
-    df = df.drop(["measure", "date", "completeness", "quality", "qcode"], axis=1)
+    df = df.drop(["quality"], axis=1)
 
     # Drop NaN values
     df = df.dropna()
@@ -0,0 +1,171 @@
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from sklearn.metrics import precision_recall_fscore_support
+
+from .trainer import Trainer
+
+
+def expand(model_config) -> list[dict]:
+    """
+    :param model_config: ModelConfig whose params map every parameter to a list of values
+    :return: one dictionary of parameters per combination of values, in the order of the grid
+    """
+    names = list(model_config.params.keys())
+
+    return [dict(zip(names, values)) for values in itertools.product(*model_config.params.values())]
+
+
+def _fit_candidate(data_name, shape, dtype, y_true_name, model_cache, name, params):
+    """
+    Fits a candidate on the training data read from shared memory, and scores it against
+    the ground truth read from shared memory too, if there is one.
+
+    :return: precision, recall and F1 score of the candidate labels, or None if there is no ground truth
+    """
+    shm = SharedMemory(name=data_name)
+    try:
+        data = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        model, _ = Trainer(data, model_cache).fit(name, **params)
+        labels = np.array(model.labels_)
+
+        # Fitted models may keep references to the shared buffer, which must be gone before closing it
+        del data, model
+    finally:
+        shm.close()
+
+    if y_true_name is None:
+        return None
+
+    y_true_shm = SharedMemory(name=y_true_name)
+    try:
+        y_true = np.ndarray((shape[0],), dtype=bool, buffer=y_true_shm.buf)
+        precision, recall, f1, _ = precision_recall_fscore_support(
+            y_true, labels, average='binary', zero_division=0)
+        del y_true
+    finally:
+        y_true_shm.close()
+
+    return precision, recall, f1
+
+
+class GridSearch:
+    def __init__(self, df, workers=1, model_cache=None, done_path=None):
+        """
+        :param done_path: JSON file where the results of the candidates are stored as they finish,
+            so later searches over the same data skip them. Results are only kept in memory without it
+        """
+        if workers < 1:
+            raise ValueError(f'workers must be at least 1, got {workers}')
+
+        self._data = np.ascontiguousarray(np.asarray(df, dtype=np.float64))
+        self._data_hash = hashlib.sha256(self._data.tobytes()).hexdigest()
+        self._workers = workers
+        self._model_cache = model_cache
+        self._done_path = done_path
+
+        # Results of the (model, params, data hash, ground truth hash) combinations already fitted,
+        # by a hash of the combination
+        self._done = {}
+        if done_path is not None and os.path.exists(done_path):
+            with open(done_path) as f:
+                self._done = json.load(f)
+
+    def run(self, models, y_true=None, on_result=None) -> dict[str, list[list]]:
+        """
+        Fits every combination of parameters of every model in parallel, skipping
+        combinations already fitted on the same data.
+
+        :param models: list of ModelConfig, as read by ConfigReader
+        :param y_true: boolean array with the actual outliers, to score the candidates
+        :param on_result: called with the results so far every time a candidate finishes
+        :return: dictionary of model name to rows of [name, *params, precision, recall, F1 score],
+            in the order of the grid
+        """
+        y_true_hash = None
+        if y_true is not None:
+            y_true = np.asarray(y_true, dtype=bool)
+            y_true_hash = hashlib.sha256(y_true.tobytes()).hexdigest()
+
+        candidates = {}
+        for model in models:
+            for params in expand(model):
+                key = self._key(model.name, params, y_true_hash)
+                if key not in self._done and key not in candidates:
+                    candidates[key] = (model.name, params)
+
+        if not candidates:
+            return self._results(models, y_true_hash)
+
+        # The training data and the ground truth go through shared memory, so tasks only carry their names
+        shms = []
+        try:
+            shm = SharedMemory(create=True, size=max(self._data.nbytes, 1))
+            shms.append(shm)
+            np.ndarray(self._data.shape, dtype=self._data.dtype, buffer=shm.buf)[:] = self._data
+
+            y_true_name = None
+            if y_true is not None:
+                y_true_shm = SharedMemory(create=True, size=max(y_true.nbytes, 1))
+                shms.append(y_true_shm)
+                np.ndarray(y_true.shape, dtype=bool, buffer=y_true_shm.buf)[:] = y_true
+                y_true_name = y_true_shm.name
+
+            args = (shm.name, self._data.shape, self._data.dtype, y_true_name, self._model_cache)
+
+            if self._workers == 1:
+                for key, (name, params) in candidates.items():
+                    self._finish(key, _fit_candidate(*args, name, params))
+                    self._notify(models, y_true_hash, on_result)
+            else:
+                with ProcessPoolExecutor(max_workers=self._workers) as executor:
+                    futures = {
+                        executor.submit(_fit_candidate, *args, name, params): key
+                        for key, (name, params) in candidates.items()
+                    }
+                    for future in as_completed(futures):
+                        self._finish(futures[future], future.result())
+                        self._notify(models, y_true_hash, on_result)
+        finally:
+            for shm in shms:
+                shm.close()
+                shm.unlink()
+
+        return self._results(models, y_true_hash)
+
+    def _finish(self, key, scores):
+        self._done[key] = None if scores is None else list(scores)
+        if self._done_path is None:
+            return
+
+        os.makedirs(os.path.dirname(self._done_path) or '.', exist_ok=True)
+        with open(self._done_path + '.tmp', 'w') as f:
+            json.dump(self._done, f)
+        os.replace(self._done_path + '.tmp', self._done_path)
+
+    def _notify(self, models, y_true_hash, on_result):
+        if on_result is not None:
+            on_result(self._results(models, y_true_hash))
+
+    def _results(self, models, y_true_hash) -> dict[str, list[list]]:
+        results = {}
+        for model in models:
+            for params in expand(model):
+                key = self._key(model.name, params, y_true_hash)
+                if key not in self._done:
+                    continue
+
+                scores = self._done[key] or (None, None, None)
+                results.setdefault(model.name, []).append([model.name, *params.values(), *scores])
+
+        return results
+
+    def _key(self, name, params, y_true_hash) -> str:
+        key = name, tuple(sorted((k, repr(v)) for k, v in params.items())), self._data_hash, y_true_hash
+
+        return hashlib.sha256(repr(key).encode()).hexdigest()
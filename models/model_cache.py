@@ -0,0 +1,120 @@
+import hashlib
+import os
+
+import numpy as np
+
+from .serializer import Serializer
+
+
+class ModelCache:
+    """
+    Fitted models stored on disk by a hash of their class, parameters and
+    training data, so a model already fitted on the same data is loaded
+    instead of fitted again. Models are loaded memory-mapped, and the least
+    recently used ones are evicted once the cache grows past max_bytes.
+    """
+    EXTENSION = '.joblib'
+
+    def __init__(self, models_path, max_bytes=1 << 30, mmap_mode='r'):
+        self._serializer = Serializer(models_path)
+        self.max_bytes = max_bytes
+        self.mmap_mode = mmap_mode
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'bytes': sum(size for _, _, size in self._entries()),
+        }
+
+    @staticmethod
+    def key(model_class, params, X) -> str:
+        X = np.ascontiguousarray(X)
+        # Random state objects mean the model is not seeded, as None does
+        params = {
+            name: None if isinstance(value, (np.random.RandomState, np.random.Generator)) else value
+            for name, value in params.items()
+        }
+
+        digest = hashlib.sha256()
+        digest.update(f'{model_class.__module__}.{model_class.__qualname__}'.encode())
+        digest.update(repr(sorted(params.items())).encode())
+        digest.update(f'{X.dtype.str}{X.shape}'.encode())
+        digest.update(X.tobytes())
+
+        return digest.hexdigest()
+
+    def get(self, key):
+        name = key + ModelCache.EXTENSION
+        try:
+            model = self._serializer.load_model(name, mmap_mode=self.mmap_mode)
+            # The modification time is the last access time of the LRU policy
+            os.utime(self._serializer.model_path(name))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        return model
+
+    def put(self, key, model):
+        self._serializer.save_model(model, key + ModelCache.EXTENSION)
+        self._evict()
+
+    def fit(self, model, X, **fit_params):
+        """
+        Fits model on X, copying the fitted attributes of the cached model of the same
+        class and parameters fitted on X if there is one, or fitting it and caching it.
+        The model keeps its own parameters, such as its random state object.
+
+        :return: model
+        """
+        params = model.get_params(deep=False)
+        key = ModelCache.key(type(model), params, X)
+
+        cached = self.get(key)
+        if cached is not None:
+            for name, value in vars(cached).items():
+                if name not in params:
+                    setattr(model, name, value)
+            return model
+
+        model.fit(X, **fit_params)
+        self.put(key, model)
+
+        return model
+
+    def _entries(self):
+        entries = []
+        for name in self._serializer.list_models():
+            if not name.endswith(ModelCache.EXTENSION):
+                continue
+            try:
+                stat = os.stat(self._serializer.model_path(name))
+            except FileNotFoundError:
+                # Evicted by another process in the meantime
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        for _, name, size in entries:
+            if total <= self.max_bytes:
+                break
+
+            try:
+                self._serializer.delete_model(name)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
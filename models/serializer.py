@@ -8,8 +8,20 @@ class Serializer:
 
         os.makedirs(models_path, exist_ok=True)
 
-    def load_model(self, name):
-        return joblib.load(os.path.join(self.models_path, name))
+    def load_model(self, name, mmap_mode=None):
+        return joblib.load(self.model_path(name), mmap_mode=mmap_mode)
 
     def save_model(self, model, name):
-        joblib.dump(model, os.path.join(self.models_path, name))
+        # Dump under a temporary name first, so readers never see a half-written model
+        tmp_path = f'{self.model_path(name)}.{os.getpid()}.tmp'
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, self.model_path(name))
+
+    def delete_model(self, name):
+        os.remove(self.model_path(name))
+
+    def list_models(self):
+        return [name for name in os.listdir(self.models_path) if not name.endswith('.tmp')]
+
+    def model_path(self, name):
+        return os.path.join(self.models_path, name)
@@ -4,13 +4,14 @@ from pyod.models.kde import KDE
 
 
 class Trainer:
-    def __init__(self, df):
+    def __init__(self, df, model_cache=None):
         self._available_models = {
             "iforest": IForest,
             "lof": LOF,
             "kde": KDE,
         }
         self._df = df
+        self._model_cache = model_cache
 
     def fit(self, name, **kwargs):
         if name not in self._available_models:
@@ -18,6 +19,9 @@ class Trainer:
 
         model = self._available_models[name](**kwargs)
 
-        model.fit(self._df)
+        if self._model_cache is not None:
+            model = self._model_cache.fit(model, self._df)
+        else:
+            model.fit(self._df)
 
         return model, model.decision_scores_
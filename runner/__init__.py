@@ -0,0 +1,8 @@
+from utils.lazy import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'FakeAPI': '.fake_api',
+    'Scheduler': '.scheduler',
+    'StreamingService': '.service',
+    'StreamSink': '.stream_sink',
+})
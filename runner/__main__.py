@@ -0,0 +1,138 @@
+import argparse
+import datetime
+import os
+
+from active_outlier_detection.detection_pipeline.names import SCORERS
+
+
+def main():
+    args = parse_args()
+
+    from active_outlier_detection.detection_pipeline import ScoringQueue
+    from data_fetch import Requester
+    from .service import StreamingService
+
+    # The API gives its times in UTC
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=args.since_days)
+
+    requester = Requester(
+        args.station_names, args.data_path, None, None, base_url=args.base_url or Requester.BASE_URL)
+    service = StreamingService(requester, args.station_names, args.output_path, since, args.poll_interval, {
+        'window_size': args.window_size,
+        'n_estimators': args.n_trees,
+        'alpha': args.alpha,
+        'outlier_threshold': args.outlier_threshold,
+        'ks_engine': 'fast',
+        'scorer': args.scorer,
+        'scoring_queue': ScoringQueue(args.max_batch_size) if args.max_batch_size else None,
+    })
+
+    print(f'Polling {", ".join(args.station_names)} every {args.poll_interval} seconds...')
+    try:
+        service.run(args.max_polls)
+    except KeyboardInterrupt:
+        print('Stopped, the service resumes from the last poll when started again')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Keep polling stations for new readings and score them as they arrive.')
+
+    parser.add_argument(
+        '-s',
+        '--station_names',
+        type=str,
+        nargs='+',
+        required=True,
+        help='Station names to poll.')
+
+    parser.add_argument(
+        '-o',
+        '--output_path',
+        type=str,
+        default=os.path.join(os.getcwd(), 'stream'),
+        help='The path to store the scored readings, the state of the service and its metrics. '
+             './stream by default.')
+
+    parser.add_argument(
+        '-d',
+        '--data_path',
+        type=str,
+        default=os.getcwd(),
+        help='The path to store the measure ids of the stations. Current working directory by default.')
+
+    parser.add_argument(
+        '-i',
+        '--poll_interval',
+        type=float,
+        default=900,
+        help='Seconds between polls. 900 by default, as readings come every 15 minutes.')
+
+    parser.add_argument(
+        '--since_days',
+        type=float,
+        default=1,
+        help='Days of readings to request on the first poll of a station, to fill its first windows. '
+             '1 by default.')
+
+    parser.add_argument(
+        '-w',
+        '--window_size',
+        type=int,
+        default=50,
+        help='Window size of the pipelines. 50 by default.')
+
+    parser.add_argument(
+        '-n',
+        '--n_trees',
+        type=int,
+        default=100,
+        help='Number of trees of the Isolation Forests. 100 by default.')
+
+    parser.add_argument(
+        '-a',
+        '--alpha',
+        type=float,
+        default=0.01,
+        help='Significance level of the KS test. 0.01 by default.')
+
+    parser.add_argument(
+        '-t',
+        '--outlier_threshold',
+        type=float,
+        default=0.75,
+        help='Scores from which a reading is an outlier. 0.75 by default.')
+
+    parser.add_argument(
+        '--scorer',
+        type=str,
+        choices=SCORERS,
+        default='iforest',
+        help='Outlier scorer. iforest scores readings once their window is full, hst (Half-Space Trees) '
+             'as soon as they arrive. iforest by default.')
+
+    parser.add_argument(
+        '--max_batch_size',
+        type=int,
+        default=None,
+        help='Score the windows of each station between refits in batches of up to this many readings, one '
+             'call per batch instead of one per window, waiting at most a second for a batch to fill. '
+             'Every window is scored right away by default.')
+
+    parser.add_argument(
+        '--base_url',
+        type=str,
+        default=None,
+        help='Base URL of the API, to poll a different deployment or a local one. The public API by default.')
+
+    parser.add_argument(
+        '--max_polls',
+        type=int,
+        default=None,
+        help='Stop after this many polls. Forever by default.')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    main()
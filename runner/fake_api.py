@@ -0,0 +1,137 @@
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+
+class FakeAPI:
+    """
+    Local stand-in for the hydrology API, serving the station search and the readings CSV of a
+    synthetic series per station, to run the streaming service against. Readings come every 15
+    minutes from start up to now, which advance() moves forward as if new readings arrived, and the
+    stations in malformed get a broken CSV instead of their readings.
+
+    with FakeAPI(['Station A'], '2023-01-01', '2023-01-02') as api:
+        requester = Requester(['Station A'], data_path, None, None, base_url=api.url)
+    """
+    FREQ = pd.Timedelta(minutes=15)
+    MALFORMED_CSV = b'dateTime,value,quality\n2023-01-01T00:00:00,1.0,Good\n2023-01-01T00:15:00,"1.0,Good\n'
+
+    def __init__(self, station_names, start, now):
+        self.station_names = station_names
+        self.start = pd.Timestamp(start, tz='UTC')
+        self.now = pd.Timestamp(now, tz='UTC')
+        self.malformed = set()
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.api = self
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}/hydrology/id'
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def advance(self, readings):
+        self.now += readings * FakeAPI.FREQ
+
+    def readings(self, station_name, since=None) -> pd.DataFrame:
+        """
+        :return: readings of a station from since, inclusive as the min-dateTime filter of the API, up to now
+        """
+        index = pd.date_range(self.start, self.now, freq=FakeAPI.FREQ)
+        if since is not None:
+            index = index[index >= since]
+
+        # Deterministic in the time of every reading, so a reading is the same whenever it is requested
+        t = (index - self.start) // FakeAPI.FREQ
+        t = np.asarray(t, dtype=np.float64)
+        values = np.sin(t / 50) + 0.1 * np.sin(t * 12.9898 + len(station_name))
+        values[(t.astype(np.int64) * 7919) % 997 == 0] += 3
+
+        return pd.DataFrame({'value': values.round(3), 'quality': 'Good'}, index=index)
+
+    @staticmethod
+    def notation(station_name) -> str:
+        return station_name.replace(' ', '').lower()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        api = self.server.api
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path.endswith('/stations.json'):
+            items = [{'notation': FakeAPI.notation(name)} for name in api.station_names
+                     if name.lower() == query['search'][0].lower()]
+            self._send(json.dumps({'items': items}).encode(), 'application/json')
+        elif url.path.endswith('/readings.csv'):
+            notation = url.path.split('/')[-2].split('-level')[0]
+            station_name = next((name for name in api.station_names if FakeAPI.notation(name) == notation), None)
+            if station_name is None:
+                self.send_error(404)
+            elif station_name in api.malformed:
+                self._send(FakeAPI.MALFORMED_CSV, 'text/csv')
+            else:
+                since = pd.Timestamp(query['min-dateTime'][0], tz='UTC') if 'min-dateTime' in query else None
+                df = api.readings(station_name, since)
+                df.index = df.index.strftime('%Y-%m-%dT%H:%M:%S')
+                self._send(df.rename_axis('dateTime').to_csv().encode(), 'text/csv')
+        else:
+            self.send_error(404)
+
+    def _send(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def check():
+    """
+    Drives StreamingService.poll_once through the Requester against a FakeAPI: a station answered
+    with a malformed CSV is skipped without stopping the others, and catches up on the next poll.
+    """
+    from data_fetch import Requester
+    from .service import StreamingService
+    from .stream_sink import StreamSink
+
+    station_names = ['Station A', 'Station B']
+    with FakeAPI(station_names, '2023-01-01', '2023-01-02') as api, tempfile.TemporaryDirectory() as path:
+        requester = Requester(station_names, path, None, None, max_attempts=1, base_url=api.url)
+        service = StreamingService(requester, station_names, path, api.start, 0, {
+            'window_size': 10, 'n_estimators': 10, 'random_state': 0})
+
+        api.malformed.add('Station B')
+        assert service.poll_once() == 96
+        api.malformed.clear()
+        api.advance(4)
+        assert service.poll_once() == 4 + 100
+
+        for station_name in station_names:
+            records = StreamSink(os.path.join(path, station_name.replace(' ', ''), StreamingService.SINK_FILE)).read()
+            expected = api.readings(station_name, api.start + FakeAPI.FREQ)
+            assert np.array_equal(records['timestamp'], expected.index.asi8[:len(records)])
+            assert np.allclose(records['value'], expected['value'].to_numpy()[:len(records)])
+
+    print('poll_once skipped the malformed station and caught up on the next poll')
+
+
+if __name__ == '__main__':
+    check()
@@ -0,0 +1,312 @@
+import hashlib
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from threadpoolctl import threadpool_limits
+
+from active_outlier_detection.detection_pipeline import KSBLWINIForest, ResultSink
+from utils import instrumentation
+from utils.instrumentation import Stats
+
+
+@dataclass(frozen=True)
+class Job:
+    station: str
+    window_size: int
+    length: int
+    # Values are read from shared memory, or from a .npy file when they are fed in chunks
+    values_name: str | None
+    threads: int
+    pipeline_params: dict = field(default_factory=dict)
+    checkpoint_every: int | None = None
+    instrument: bool = False
+    chunk_size: int | None = None
+    values_path: str | None = None
+    # Outputs go to the on-disk sink of the station if it has one, to shared memory otherwise
+    sink_path: str | None = None
+    scores_name: str | None = None
+    labels_name: str | None = None
+
+
+def _attach(name, length, dtype):
+    shm = SharedMemory(name=name)
+    return shm, np.ndarray((length,), dtype=dtype, buffer=shm.buf)
+
+
+def _checkpoint_path(sink, window_size):
+    return os.path.join(sink.path, 'checkpoints', f'w{window_size}.ckpt')
+
+
+def _load_checkpoint(sink, window_size, values_hash, model_cache, scoring_queue):
+    path = _checkpoint_path(sink, window_size)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'rb') as f:
+        checkpoint = pickle.load(f)
+
+    # Checkpoints of another series are not resumed
+    if checkpoint['values_hash'] != values_hash:
+        return None
+
+    sink.truncate(window_size, checkpoint['written'])
+
+    return KSBLWINIForest.restore(checkpoint['pipeline'], model_cache, scoring_queue)
+
+
+def _save_checkpoint(sink, window_size, values_hash, pipeline):
+    sink.flush()
+
+    path = _checkpoint_path(sink, window_size)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump({
+            'values_hash': values_hash,
+            'written': sink.written(window_size),
+            'pipeline': pipeline.snapshot(),
+        }, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    os.replace(path + '.tmp', path)
+
+
+def _values_hash(values, chunk_size=1 << 20):
+    # Hashed chunk by chunk, as hashing the bytes of a memory-mapped series at once would copy it into memory
+    digest = hashlib.sha256()
+    for start in range(0, len(values), chunk_size):
+        digest.update(np.ascontiguousarray(values[start:start + chunk_size]))
+
+    return digest.hexdigest()
+
+
+def _run_pipeline(values, window_size, pipeline_params, sink, checkpoint_every=None, chunk_size=None):
+    """
+    Runs the pipeline over values into sink. With checkpoint_every and an on-disk sink,
+    the pipeline is snapshotted every checkpoint_every elements next to the sink, and
+    a later run over the same series resumes from the last snapshot.
+
+    With chunk_size, values are fed to the pipeline chunk_size elements at a time, so a
+    memory-mapped series is only read, and converted to float64, one chunk at a time.
+    """
+    checkpoint = checkpoint_every is not None and sink.path is not None
+
+    pipeline = None
+    values_hash = None
+    if checkpoint:
+        # A cache hit leaves the random state of the forest where it was, while fitting draws from it, so
+        # a resumed run hitting the forests its interrupted run cached would diverge from an uninterrupted one
+        pipeline_params = {**pipeline_params, 'model_cache': None}
+
+        values_hash = _values_hash(values)
+        pipeline = _load_checkpoint(
+            sink, window_size, values_hash, pipeline_params.get('model_cache'), pipeline_params.get('scoring_queue'))
+
+    if pipeline is None:
+        pipeline = KSBLWINIForest(window_size=window_size, **pipeline_params)
+        sink.truncate(window_size, 0)
+
+    step = chunk_size or (checkpoint_every if checkpoint else None) or max(len(values), 1)
+    last_checkpoint = pipeline.offset
+    for start in range(pipeline.offset, len(values), step):
+        pipeline.run_batch(values[start:start + step], sink)
+
+        if checkpoint and (pipeline.offset - last_checkpoint >= checkpoint_every or pipeline.offset == len(values)):
+            _save_checkpoint(sink, window_size, values_hash, pipeline)
+            last_checkpoint = pipeline.offset
+
+    sink.flush()
+
+    return sink.written(window_size)
+
+
+def _run_job(job: Job) -> tuple[int, Stats | None]:
+    """
+    :return: number of scored elements of the job and its instrumentation stats, if enabled
+    """
+    with instrumentation.collect(Stats() if job.instrument else None) as stats:
+        return _score_job(job), stats
+
+
+def _score_job(job: Job) -> int:
+    """
+    Runs the pipeline of a (station, window size) job. The series is read from
+    shared memory or a memory-mapped file and the outputs are written into the
+    memory-mapped sink of the station or into shared memory, so only the job
+    description and the scored length travel between processes.
+
+    :return: number of scored elements
+    """
+    if job.values_path is not None:
+        values_shm, values = None, np.load(job.values_path, mmap_mode='r')
+    else:
+        values_shm, values = _attach(job.values_name, job.length, np.float64)
+    try:
+        with threadpool_limits(limits=job.threads):
+            if job.sink_path is not None:
+                sink = ResultSink.open(job.sink_path, flush_every=job.chunk_size or ResultSink.FLUSH_EVERY)
+
+                return _run_pipeline(
+                    values, job.window_size, job.pipeline_params, sink, job.checkpoint_every, job.chunk_size)
+
+            pipeline = KSBLWINIForest(window_size=job.window_size, **job.pipeline_params)
+            job_scores, job_labels = pipeline.run_batch(values)
+
+        scores_shm, scores = _attach(job.scores_name, job.length, np.float64)
+        labels_shm, labels = _attach(job.labels_name, job.length, bool)
+        scores[:len(job_scores)] = job_scores
+        labels[:len(job_labels)] = job_labels
+
+        del scores, labels
+        scores_shm.close()
+        labels_shm.close()
+
+        return len(job_scores)
+    finally:
+        del values
+        if values_shm is not None:
+            values_shm.close()
+
+
+class Scheduler:
+    def __init__(self, workers=1, pipeline_params=None, checkpoint_every=None, instrument=False, chunk_size=None):
+        if workers < 1:
+            raise ValueError(f'workers must be at least 1, got {workers}')
+
+        self.workers = workers
+        self.pipeline_params = pipeline_params or {}
+        # Elements between checkpoints of the jobs with an on-disk sink, None to disable checkpoints
+        self.checkpoint_every = checkpoint_every
+
+        # Elements fed to the pipelines at a time, None to feed whole series. With on-disk sinks, every chunk is
+        # written out as it is scored, and series are passed to pool workers in files instead of shared memory,
+        # so memory does not grow with their length
+        self.chunk_size = chunk_size
+
+        # With instrument, the instrumentation stats of the jobs of every station of the last run
+        self.instrument = instrument
+        self.stats: dict[str, Stats] = {}
+
+        # Split the cores between workers so multi-threaded native code inside a job does not oversubscribe them
+        self._threads = max(1, (os.cpu_count() or 1) // workers)
+
+    def run(self, series, window_sizes, sink_paths=None) -> dict[str, ResultSink]:
+        """
+        Runs the pipeline for every (station, window size) pair across a pool of processes.
+
+        :param series: dictionary of station name to 1D array of values, which can be memory-mapped
+        :param window_sizes: window sizes to run for every station
+        :param sink_paths: dictionary of station name to the directory of its on-disk sink.
+            Stations without one get an in-memory sink. With checkpoints, existing sinks are
+            reopened, so jobs interrupted before resume from their last checkpoint
+        :return: dictionary of station name to the sink with its outputs for every window size,
+            in the same order as series no matter the order the jobs finish in
+        """
+        sink_paths = sink_paths or {}
+        sinks = {station: self._sink(len(values), window_sizes, sink_paths.get(station))
+                 for station, values in series.items()}
+        self.stats = {station: Stats() for station in series} if self.instrument else {}
+
+        if self.workers == 1:
+            for station, values in series.items():
+                with instrumentation.collect(self.stats.get(station)):
+                    for window_size in window_sizes:
+                        _run_pipeline(values, window_size, self.pipeline_params, sinks[station],
+                                      self.checkpoint_every, self.chunk_size)
+
+            return sinks
+
+        shms = []
+        values_paths = []
+        try:
+            jobs = []
+            for station, values in series.items():
+                values_name, values_path = None, None
+                if self.chunk_size is not None and sinks[station].path is not None:
+                    values_path = self._spill(values, sinks[station].path, values_paths)
+                else:
+                    values = np.asarray(values, dtype=np.float64)
+                    values_shm = self._create(values.nbytes, shms)
+                    np.ndarray(values.shape, dtype=np.float64, buffer=values_shm.buf)[:] = values
+                    values_name = values_shm.name
+
+                for window_size in window_sizes:
+                    scores_name, labels_name = None, None
+                    if sinks[station].path is None:
+                        scores_name = self._create(len(values) * 8, shms).name
+                        labels_name = self._create(len(values), shms).name
+
+                    jobs.append(Job(
+                        station,
+                        window_size,
+                        len(values),
+                        values_name,
+                        self._threads,
+                        self.pipeline_params,
+                        self.checkpoint_every,
+                        self.instrument,
+                        self.chunk_size,
+                        values_path,
+                        sinks[station].path,
+                        scores_name,
+                        labels_name))
+
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                outputs = list(executor.map(_run_job, jobs))
+
+            # On-disk sinks are shared with the workers through the mapped files, in-memory ones are filled here
+            for job, (length, stats) in zip(jobs, outputs):
+                if stats is not None:
+                    self.stats[job.station].merge(stats)
+
+                if job.sink_path is not None:
+                    continue
+
+                scores_shm, scores = _attach(job.scores_name, job.length, np.float64)
+                labels_shm, labels = _attach(job.labels_name, job.length, bool)
+                sinks[job.station].append(job.window_size, scores[:length], labels[:length])
+
+                del scores, labels
+                scores_shm.close()
+                labels_shm.close()
+
+            return sinks
+        finally:
+            for shm in shms:
+                shm.close()
+                shm.unlink()
+            for path in values_paths:
+                os.remove(path)
+
+    def _sink(self, length, window_sizes, path):
+        flush_every = self.chunk_size or ResultSink.FLUSH_EVERY
+        if path is None:
+            return ResultSink(length, window_sizes)
+        if self.checkpoint_every is not None:
+            return ResultSink.open_or_create(length, window_sizes, path, flush_every)
+
+        return ResultSink(length, window_sizes, path, flush_every)
+
+    def _spill(self, values, sink_path, values_paths) -> str:
+        """
+        Writes values as float64, chunk by chunk, to a .npy file next to the sink for the workers to map.
+        """
+        path = os.path.join(sink_path, 'values.npy')
+        out = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=(len(values),))
+        values_paths.append(path)
+        for start in range(0, len(values), self.chunk_size):
+            out[start:start + self.chunk_size] = values[start:start + self.chunk_size]
+        out.flush()
+        del out
+
+        return path
+
+    @staticmethod
+    def _create(size, shms) -> SharedMemory:
+        # Zero-sized shared memory blocks are not allowed
+        shm = SharedMemory(create=True, size=max(size, 1))
+        shms.append(shm)
+
+        return shm
@@ -0,0 +1,229 @@
+import json
+import os
+import pickle
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+import requests
+
+from active_outlier_detection.detection_pipeline import KSBLWINIForest
+from .stream_sink import StreamSink
+
+
+class LatencyMetrics:
+    """
+    Latencies of the readings of a station over the last max_samples scored ones. The latency
+    of a reading goes from the moment it is fetched to the moment it is scored, which includes
+    waiting for the rest of its window to arrive.
+    """
+    def __init__(self, max_samples=10_000):
+        self.readings = 0
+        self.scored = 0
+        self.last_poll_readings = 0
+        self.last_poll_seconds = 0.0
+        self._latencies = deque(maxlen=max_samples)
+
+    def record(self, readings, latencies, seconds):
+        """
+        :param readings: number of readings fetched by a poll
+        :param latencies: latencies in seconds of the readings scored by the poll
+        :param seconds: time spent fetching and scoring the poll
+        """
+        self.readings += readings
+        self.scored += len(latencies)
+        self.last_poll_readings = readings
+        self.last_poll_seconds = seconds
+        self._latencies.extend(latencies)
+
+    def summary(self) -> dict:
+        latencies = np.fromiter(self._latencies, dtype=np.float64)
+        summary = {
+            'readings': self.readings,
+            'scored': self.scored,
+            'last_poll_readings': self.last_poll_readings,
+            'last_poll_seconds': self.last_poll_seconds,
+            'seconds_per_reading': self.last_poll_seconds / max(self.last_poll_readings, 1),
+        }
+        if len(latencies):
+            summary.update({
+                'latency_mean': float(latencies.mean()),
+                'latency_p50': float(np.percentile(latencies, 50)),
+                'latency_p95': float(np.percentile(latencies, 95)),
+                'latency_max': float(latencies.max()),
+            })
+
+        return summary
+
+
+@dataclass
+class StationState:
+    pipeline: KSBLWINIForest
+    last_timestamp: pd.Timestamp
+    # Readings fed to the pipeline whose window has not been scored yet
+    pending_timestamps: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    pending_values: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+    pending_fetched: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float64))
+    # Number of records in the sink of the station
+    written: int = 0
+
+
+class StreamingService:
+    """
+    Keeps one KSBLWINIForest per station in memory and polls the API for the readings
+    newer than the last one seen, feeding them through the pipeline and appending the
+    scored readings to a StreamSink per station.
+
+    The state of every station is saved after each poll, so a restarted service
+    resumes from the last reading seen instead of requesting the history again.
+
+    Layout of <output_path>/:
+        state.pkl               pipelines, last reading seen and pending readings of every station
+        metrics.json            latency metrics of every station, updated after each poll
+        <station>/stream.bin    StreamSink of the station
+    """
+    STATE_FILE = 'state.pkl'
+    METRICS_FILE = 'metrics.json'
+    SINK_FILE = 'stream.bin'
+
+    def __init__(self, requester, station_names, output_path, since, poll_interval=900, pipeline_params=None):
+        """
+        :param requester: Requester to poll the readings with
+        :param since: timestamp to request the readings from for stations without saved state
+        :param poll_interval: seconds between the start of two polls
+        :param pipeline_params: keyword arguments of KSBLWINIForest
+        """
+        self._requester = requester
+        self._station_names = station_names
+        self._output_path = output_path
+        self._poll_interval = poll_interval
+        self._pipeline_params = pipeline_params or {}
+
+        os.makedirs(output_path, exist_ok=True)
+
+        self._states = self._load_states()
+        self._sinks = {}
+        self.metrics = {}
+        for station_name in station_names:
+            if station_name not in self._states:
+                self._states[station_name] = StationState(
+                    KSBLWINIForest(**self._pipeline_params), pd.Timestamp(since))
+
+            sink = StreamSink(os.path.join(output_path, station_name.replace(' ', ''), StreamingService.SINK_FILE))
+            # Records appended after the last saved state are fed again by the next poll
+            sink.truncate(self._states[station_name].written)
+
+            self._sinks[station_name] = sink
+            self.metrics[station_name] = LatencyMetrics()
+
+    def run(self, max_polls=None):
+        """
+        Polls every poll_interval seconds, forever or max_polls times.
+        """
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            started = time.monotonic()
+            self.poll_once()
+            polls += 1
+
+            if max_polls is None or polls < max_polls:
+                time.sleep(max(self._poll_interval - (time.monotonic() - started), 0))
+
+    def poll_once(self) -> int:
+        """
+        Requests, scores and stores the new readings of every station once.
+
+        :return: number of new readings
+        """
+        new_readings = 0
+        for station_name in self._station_names:
+            try:
+                new_readings += self._poll_station(station_name)
+            except (requests.RequestException, ValueError) as e:
+                # Malformed bodies raise pandas' ParserError or EmptyDataError, both ValueErrors.
+                # The station is polled again from the same reading next time
+                print(f'Could not poll {station_name}: {type(e).__name__}: {e}')
+
+        self._save_states()
+        self._save_metrics()
+
+        return new_readings
+
+    def _poll_station(self, station_name) -> int:
+        state = self._states[station_name]
+
+        started = time.perf_counter()
+        fetched = time.time()
+        df = self._requester.request_since(station_name, state.last_timestamp)
+        if df.empty:
+            return 0
+
+        values = df['value'].to_numpy(dtype=np.float64)
+        # The state is only updated once the readings are scored, so a failing poll leaves it as it was
+        pending_timestamps = np.concatenate([
+            state.pending_timestamps,
+            df.index.values.astype('datetime64[ns]').astype(np.int64)])
+        pending_values = np.concatenate([state.pending_values, values])
+        pending_fetched = np.concatenate([state.pending_fetched, np.full(len(values), fetched)])
+
+        scores, labels = state.pipeline.run_batch(values)
+        n_scored = len(scores)
+        self._sinks[station_name].append(
+            pending_timestamps[:n_scored], pending_values[:n_scored], scores, labels)
+
+        self.metrics[station_name].record(
+            len(values), time.time() - pending_fetched[:n_scored], time.perf_counter() - started)
+
+        state.pending_timestamps = pending_timestamps[n_scored:]
+        state.pending_values = pending_values[n_scored:]
+        state.pending_fetched = pending_fetched[n_scored:]
+        state.written += n_scored
+        state.last_timestamp = df.index[-1]
+
+        return len(values)
+
+    def _load_states(self) -> dict[str, StationState]:
+        path = os.path.join(self._output_path, StreamingService.STATE_FILE)
+        if not os.path.exists(path):
+            return {}
+
+        with open(path, 'rb') as f:
+            states = pickle.load(f)
+
+        model_cache = self._pipeline_params.get('model_cache')
+        scoring_queue = self._pipeline_params.get('scoring_queue')
+        for state in states.values():
+            state.pipeline = KSBLWINIForest.restore(state.pipeline, model_cache, scoring_queue)
+
+        return states
+
+    def _save_states(self):
+        states = {
+            station_name: StationState(
+                state.pipeline.snapshot(),
+                state.last_timestamp,
+                state.pending_timestamps,
+                state.pending_values,
+                state.pending_fetched,
+                state.written)
+            for station_name, state in self._states.items()
+        }
+
+        path = os.path.join(self._output_path, StreamingService.STATE_FILE)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(states, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(path + '.tmp', path)
+
+    def _save_metrics(self):
+        path = os.path.join(self._output_path, StreamingService.METRICS_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({station_name: {
+                'last_timestamp': self._states[station_name].last_timestamp.isoformat(),
+                'pending': len(self._states[station_name].pending_values),
+                **metrics.summary(),
+            } for station_name, metrics in self.metrics.items()}, f, indent=2)
+
+        os.replace(path + '.tmp', path)
@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+
+
+class StreamSink:
+    """
+    Append-only file with the scored readings of a station, one fixed-size
+    record per reading, in the order they were scored. Records are never
+    rewritten, so the file can be read while the service keeps appending to it.
+    """
+    DTYPE = np.dtype([
+        ('timestamp', '<i8'),  # nanoseconds since epoch
+        ('value', '<f8'),
+        ('score', '<f8'),
+        ('label', '?'),
+    ])
+
+    def __init__(self, path):
+        self.path = path
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        open(path, 'ab').close()
+
+    def __len__(self):
+        return os.path.getsize(self.path) // StreamSink.DTYPE.itemsize
+
+    def append(self, timestamps, values, scores, labels):
+        records = np.empty(len(scores), dtype=StreamSink.DTYPE)
+        records['timestamp'] = timestamps
+        records['value'] = values
+        records['score'] = scores
+        records['label'] = labels
+
+        with open(self.path, 'ab') as f:
+            f.write(records.tobytes())
+
+    def truncate(self, length):
+        """
+        Discards the records after the first length ones, such as the ones written
+        after the last saved state of the service.
+        """
+        os.truncate(self.path, length * StreamSink.DTYPE.itemsize)
+
+    def read(self) -> np.ndarray:
+        """
+        :return: structured array with the records written so far, memory-mapped
+        """
+        if len(self) == 0:
+            return np.empty(0, dtype=StreamSink.DTYPE)
+
+        return np.memmap(self.path, dtype=StreamSink.DTYPE, mode='r', shape=(len(self),))
@@ -0,0 +1,12 @@
+import argparse
+
+
+def positive_int(value) -> int:
+    """
+    argparse type of integer arguments that must be at least 1, such as numbers of workers.
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'{value} is not a positive integer')
+
+    return number
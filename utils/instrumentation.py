@@ -0,0 +1,147 @@
+import contextlib
+import json
+import math
+import threading
+import time
+
+# Histogram buckets are powers of two of microseconds, the last one holding everything slower
+N_BUCKETS = 40
+
+# Stats of the innermost collect context, None when instrumentation is disabled
+_collector = None
+
+_NULL_STAGE = contextlib.nullcontext()
+
+
+class Stats:
+    """
+    Wall time histograms of the stages and counters recorded while collecting.
+    The time of a stage is the time spent in it, including its inner stages.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        # Bucket b holds the times in [2^(b-1), 2^b) microseconds
+        bucket = min(max(math.frexp(seconds * 1e6)[1], 0), N_BUCKETS - 1)
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = {'count': 0, 'seconds': 0.0, 'max': 0.0, 'buckets': [0] * N_BUCKETS}
+
+            stage['count'] += 1
+            stage['seconds'] += seconds
+            stage['max'] = max(stage['max'], seconds)
+            stage['buckets'][bucket] += 1
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, other):
+        """
+        Adds the stages and counters of other, such as the ones collected by another process.
+        """
+        for name, other_stage in other.stages.items():
+            stage = self.stages.setdefault(
+                name, {'count': 0, 'seconds': 0.0, 'max': 0.0, 'buckets': [0] * N_BUCKETS})
+            stage['count'] += other_stage['count']
+            stage['seconds'] += other_stage['seconds']
+            stage['max'] = max(stage['max'], other_stage['max'])
+            stage['buckets'] = [a + b for a, b in zip(stage['buckets'], other_stage['buckets'])]
+
+        for name, n in other.counters.items():
+            self.count(name, n)
+
+    def summary(self) -> dict:
+        """
+        :return: count, total, mean, median, 95th percentile and maximum time of every stage, with
+            the percentiles being the upper bounds of their histogram buckets, and the counters.
+            Samples per second are the samples counted over the time spent in the pipeline stage
+        """
+        summary = {'stages': {}, 'counters': dict(self.counters)}
+        for name, stage in self.stages.items():
+            summary['stages'][name] = {
+                'count': stage['count'],
+                'total_seconds': stage['seconds'],
+                'mean_seconds': stage['seconds'] / stage['count'],
+                'p50_seconds': self._percentile(stage['buckets'], 0.5),
+                'p95_seconds': self._percentile(stage['buckets'], 0.95),
+                'max_seconds': stage['max'],
+                'histogram': {
+                    f'<{2 ** bucket}us': n for bucket, n in enumerate(stage['buckets']) if n
+                },
+            }
+
+        pipeline = self.stages.get('pipeline')
+        if pipeline is not None and pipeline['seconds'] > 0:
+            summary['samples_per_second'] = self.counters.get('samples', 0) / pipeline['seconds']
+
+        return summary
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _percentile(buckets, q):
+        target = q * sum(buckets)
+        cumulative = 0
+        for bucket, n in enumerate(buckets):
+            cumulative += n
+            if cumulative >= target:
+                return 2 ** bucket * 1e-6
+
+        return 2 ** (N_BUCKETS - 1) * 1e-6
+
+
+@contextlib.contextmanager
+def collect(stats):
+    """
+    Records the stages and counters of the code run in the context into stats.
+    With stats None, they keep going to the enclosing context, if any, so instrumentation
+    stays disabled unless some caller enabled it.
+    """
+    global _collector
+    previous = _collector
+    if stats is not None:
+        _collector = stats
+    try:
+        yield stats
+    finally:
+        _collector = previous
+
+
+def stage(name):
+    """
+    Context manager timing the code in it as the given stage, doing nothing if disabled.
+    """
+    if _collector is None:
+        return _NULL_STAGE
+
+    return _collector.stage(name)
+
+
+def count(name, n=1):
+    if _collector is not None:
+        _collector.count(name, n)
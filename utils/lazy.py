@@ -0,0 +1,27 @@
+import importlib
+
+
+def lazy_exports(package, exports):
+    """
+    Module __getattr__ and __dir__ of a package that imports each of its exports from its
+    submodule the first time it is accessed, so importing the package, or a light submodule
+    of it, does not import pandas, scikit-learn or matplotlib until they are needed.
+
+    :param package: __name__ of the package
+    :param exports: dictionary of exported name to the relative name of its submodule
+    :return: __getattr__ and __dir__ functions to set in the package
+    """
+    def __getattr__(name):
+        if name not in exports:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+
+        value = getattr(importlib.import_module(exports[name], package), name)
+        # Later accesses find the value in the package without calling __getattr__
+        setattr(importlib.import_module(package), name, value)
+
+        return value
+
+    def __dir__():
+        return sorted(set(vars(importlib.import_module(package))) | set(exports))
+
+    return __getattr__, __dir__
@@ -0,0 +1,114 @@
+import numpy as np
+
+
+class RunningStats:
+    """
+    Count, mean and sample standard deviation of a series fed chunk by chunk, merging the
+    moments of every chunk with the ones of the chunks before it (Chan et al.), so they are
+    computed in a single pass without keeping the series in memory. Non-finite values are
+    skipped, as pandas does.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+
+        count = len(values)
+        mean = values.mean()
+        m2 = np.square(values - mean).sum()
+
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self._m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self._m2 / (self.count - 1))) if self.count > 1 else np.nan
+
+
+class StreamingROC:
+    """
+    ROC curves of scores in [0, 1] fed chunk by chunk, one per group of scores, such as the
+    configurations of a pipeline. Scores are counted in n_bins bins per group and class, so
+    memory does not depend on the length of the series, and the curves have a point per bin
+    threshold. With the default bins, scores closer than 1.5e-5 are taken as ties, which
+    changes the AUC by far less than its own variance.
+    """
+    def __init__(self, n_bins=1 << 16, n_groups=1):
+        self.n_bins = n_bins
+        self._positives = np.zeros((n_groups, n_bins), dtype=np.int64)
+        self._negatives = np.zeros((n_groups, n_bins), dtype=np.int64)
+
+    @property
+    def n_groups(self) -> int:
+        return len(self._positives)
+
+    def update(self, scores, y_true, groups=None):
+        """
+        :param groups: integer group of every score, 0 by default. Groups from n_groups on are added
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        y_true = np.asarray(y_true, dtype=bool)
+
+        scored = ~np.isnan(scores)
+        if not scored.any():
+            return
+
+        bins = np.clip((scores[scored] * self.n_bins).astype(np.int64), 0, self.n_bins - 1)
+        y_true = y_true[scored]
+        groups = np.zeros(len(bins), dtype=np.int64) if groups is None else np.asarray(groups)[scored]
+
+        # Only the range of groups in the chunk is counted, as chunks usually hold few of them
+        first, last = groups.min(), groups.max()
+        if last >= self.n_groups:
+            added = ((0, last + 1 - self.n_groups), (0, 0))
+            self._positives = np.pad(self._positives, added)
+            self._negatives = np.pad(self._negatives, added)
+
+        flat = (groups - first) * self.n_bins + bins
+        size = (last + 1 - first) * self.n_bins
+        self._positives[first:last + 1] += np.bincount(flat[y_true], minlength=size).reshape(-1, self.n_bins)
+        self._negatives[first:last + 1] += np.bincount(flat[~y_true], minlength=size).reshape(-1, self.n_bins)
+
+    def curve(self, group=0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        :return: false positive rates, true positive rates and thresholds, from the highest
+            threshold down, as sklearn.metrics.roc_curve
+        """
+        positives, negatives = self._positives[group], self._negatives[group]
+
+        # Bins from the highest scores down, keeping only the ones with scores
+        used = np.flatnonzero((positives + negatives)[::-1])
+        true_positives = np.concatenate([[0], np.cumsum(positives[::-1])[used]])
+        false_positives = np.concatenate([[0], np.cumsum(negatives[::-1])[used]])
+        thresholds = np.concatenate([[np.inf], (self.n_bins - 1 - used) / self.n_bins])
+
+        tpr = true_positives / max(true_positives[-1], 1)
+        fpr = false_positives / max(false_positives[-1], 1)
+
+        return fpr, tpr, thresholds
+
+    def auc(self, group=0) -> float:
+        fpr, tpr, _ = self.curve(group)
+
+        return float(np.trapz(tpr, fpr))
+
+    def aucs(self) -> np.ndarray:
+        """
+        :return: area under the curve of every group at once
+        """
+        # Bins without scores repeat the previous point of the curve, so they add no area
+        true_positives = np.cumsum(self._positives[:, ::-1], axis=1)
+        false_positives = np.cumsum(self._negatives[:, ::-1], axis=1)
+        tpr = true_positives / np.maximum(true_positives[:, -1:], 1)
+        fpr = false_positives / np.maximum(false_positives[:, -1:], 1)
+
+        return np.trapz(np.pad(tpr, ((0, 0), (1, 0))), np.pad(fpr, ((0, 0), (1, 0))), axis=1)